@@ -94,3 +94,15 @@ def add_nproc_option(
                                type=type, **kwargs)
 
 
+def add_image_options(parser):
+    """Add ``--image-format`` and ``--image-dpi`` options to the given parser
+    """
+    group = parser.add_argument_group('Image options')
+    group.add_argument('--image-format', default='png',
+                       choices=('png', 'svg'),
+                       help='the format of full-size images, thumbnails are '
+                            'always PNG, default: %(default)s')
+    group.add_argument('--image-dpi', type=float, default=None,
+                       help='the resolution of full-size images, '
+                            'default: that of each figure')
+    return group
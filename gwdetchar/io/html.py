@@ -34,6 +34,9 @@ BOOTSTRAP_CSS = (
 BOOTSTRAP_JS = (
     "//maxcdn.bootstrapcdn.com/bootstrap/3.3.4/js/bootstrap.min.js")
 
+# width (pixels) of the thumbnail images embedded in pages
+THUMBNAIL_WIDTH = 400
+
 
 def new_bootstrap_page(*args, **kwargs):
     """Create a new `~markup.page` with twitter bootstrap CSS and JS headers
@@ -55,8 +58,107 @@ def new_bootstrap_page(*args, **kwargs):
     return page
 
 
+def thumbnail_path(path):
+    """Return the path of the thumbnail of an image
+
+    Thumbnails are always PNG images, written to a ``thumbnails``
+    directory next to the full-size image.
+
+    Parameters
+    ----------
+    path : `str`
+        the path of the full-size image
+
+    Returns
+    -------
+    thumbnail : `str`
+        the path of its thumbnail
+    """
+    dirname, basename = os.path.split(str(path))
+    return os.path.join(dirname, 'thumbnails',
+                        '%s.png' % os.path.splitext(basename)[0])
+
+
+def save_figure(figure, path, dpi=None, thumbnail=True,
+                thumbwidth=THUMBNAIL_WIDTH, **kwargs):
+    """Save a figure, with a small thumbnail for embedding in HTML
+
+    Parameters
+    ----------
+    figure : `~matplotlib.figure.Figure`
+        the figure to save
+    path : `str`
+        the path of the full-size image, whose extension sets the format
+    dpi : `float`, optional
+        the resolution of the full-size image, defaults to that of the
+        figure
+    thumbnail : `bool`, optional
+        whether to write a thumbnail, see `thumbnail_path`,
+        default: `True`
+    thumbwidth : `int`, optional
+        the width of the thumbnail in pixels
+    **kwargs
+        other keyword arguments to pass to
+        `~matplotlib.figure.Figure.savefig`
+
+    Returns
+    -------
+    path : `str`
+        the path of the full-size image
+    """
+    path = str(path)
+    figure.savefig(path, dpi=dpi, **kwargs)
+    if thumbnail:
+        thumb = thumbnail_path(path)
+        try:
+            os.makedirs(os.path.dirname(thumb))
+        except OSError:  # already exists, perhaps made by another process
+            if not os.path.isdir(os.path.dirname(thumb)):
+                raise
+        figure.savefig(thumb, dpi=thumbwidth / figure.get_figwidth(),
+                       **kwargs)
+    return path
+
+
+def thumbnail_img(path, linkparams=dict(), **params):
+    """Return the markup to embed the thumbnail of an image in HTML
+
+    The thumbnail links to the full-size image, which is only fetched
+    when the link is followed, and thumbnails outside the visible page are
+    loaded lazily by the browser.
+
+    Parameters
+    ----------
+    path : `str`
+        the path of the full-size image, see `save_figure`
+    linkparams : `dict`
+        the HTML attributes for the ``<a>`` tag
+    **params
+        the HTML attributes for the ``<img>`` tag
+
+    Returns
+    -------
+    html : `str`
+    """
+    path = str(path)
+    aparams = {'href': path, 'target': '_blank'}
+    aparams.update(linkparams)
+    imgparams = {
+        'src': thumbnail_path(path),
+        'alt': os.path.basename(path),
+        'loading': 'lazy',
+    }
+    imgparams.update(params)
+    page = markup.page()
+    page.a(**aparams)
+    page.img(**imgparams)
+    page.a.close()
+    return str(page)
+
+
 def write_flag_html(flag, span, id=0, parent='accordion', context='warning',
-                    title=None, plotdir=None, plot_func=None):
+                    title=None, plotdir=None, plot_func=None,
+                    plotformat='png', dpi=None):
     page = markup.page()
     page.div(class_='panel panel-%s' % context)
     page.div(class_='panel-heading')
@@ -79,12 +181,10 @@ def write_flag_html(flag, span, id=0, parent='accordion', context='warning',
     if plotdir is not None and plot_func is not None:
         flagr = flag.name.replace('-', '_').replace(':', '-', 1)
         png = os.path.join(
-            plotdir, '%s-%d-%d.png' % (flagr, span[0], abs(span)))
+            plotdir, '%s-%d-%d.%s' % (flagr, span[0], abs(span), plotformat))
         plot = plot_func(flag, span)
-        plot.save(png)
-        page.a(href=png, target='_blank')
-        page.img(style="width: 100%;", src=png)
-        page.a.close()
+        save_figure(plot, png, dpi=dpi)
+        page.add(thumbnail_img(png, style="width: 100%;"))
     page.div.close()
     page.div.close()
     return page
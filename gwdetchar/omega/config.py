@@ -22,6 +22,12 @@ Configuration files for Omega Scans
 
 How to write a configuration file
 =================================
+
+Each section of a configuration file defines a block of channels.
+Blocks are processed in the order given, unless a block sets a numeric
+``priority``, as blocks with higher priority are processed first. A block
+may also list ``priority-channels``, one per line, which are analysed and
+published before any other block is read.
 """
 
 try:  # python 3.x
@@ -66,6 +72,28 @@ class OmegaConfigParser(configparser.ConfigParser):
     def getfloats(self, section, option):
         return self._get(section, comma_separated_floats, option)
 
+    def getpriority(self, section):
+        """Return the priority of a block of channels
+
+        Blocks with higher ``priority`` are processed first, the default
+        priority is 0.
+        """
+        if self.has_option(section, 'priority'):
+            return self.getfloat(section, 'priority')
+        return 0.
+
+    def getprioritychannels(self, section):
+        """Return the channels of a block to process before all others
+
+        These are given, one per line, by the ``priority-channels`` option
+        of the block.
+        """
+        if not self.has_option(section, 'priority-channels'):
+            return []
+        return [c.strip() for c in
+                self.get(section, 'priority-channels').split('\n') if
+                c.strip()]
+
     def getparams(self, section, prefix):
         nchar = len(prefix)
         params = dict((key[nchar:], val) for (key, val) in
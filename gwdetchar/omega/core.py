@@ -0,0 +1,1287 @@
+# coding=utf-8
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# GW DetChar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GW DetChar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GW DetChar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Array-native Q-transform engine for Omega scans
+
+The tiling geometry follows `gwpy.signal.qtransform` exactly, but each
+Q-plane is evaluated as a small number of 2-D arrays (one per distinct
+number of tiles per row) rather than one `~gwpy.timeseries.TimeSeries`
+per frequency row, so that peak-finding and tile selection are vectorised.
+
+All methods here operate on one-sided frequency-domain data normalised as
+by `TimeSeries.fft`; `QSpectra` computes and holds these spectra so that
+each representation of a channel is Fourier transformed only once.
+"""
+
+from __future__ import division
+
+import os
+import hashlib
+import tempfile
+import warnings
+import threading
+from collections import (deque, OrderedDict)
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+
+from six.moves import cPickle as pickle
+
+import numpy
+from numpy import fft as npfft
+
+from scipy.interpolate import interp1d
+try:
+    from scipy.fftpack import next_fast_len
+except ImportError:  # scipy < 0.18
+    def next_fast_len(target):
+        return int(next_power_of_two(target))
+
+__author__ = 'Alex Urban <alexander.urban@ligo.org>'
+__credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+__all__ = ['QSpectra', 'QTiling', 'QPlane', 'QGram', 'PlaneCache',
+           'PLANE_CACHE', 'get_plane', 'TILE_DTYPE',
+           'find_peak', 'find_loudest_plane', 'hierarchical_search',
+           'prescreen', 'eventgram', 'energy_threshold', 'NoPeakError']
+
+# structure of the output tile array
+TILE_DTYPE = numpy.dtype([
+    ('central_time', 'f8'),
+    ('central_freq', 'f8'),
+    ('duration', 'f8'),
+    ('bandwidth', 'f8'),
+    ('energy', 'f8'),
+])
+
+
+# -- utilities ----------------------------------------------------------------
+
+class NoPeakError(ValueError):
+    """Raised when no tile in the search window has positive energy
+    """
+    pass
+
+
+def next_power_of_two(x):
+    """Return the smallest power of two greater than or equal to ``x``
+
+    Parameters
+    ----------
+    x : `float`, `numpy.ndarray`
+        the input value(s)
+
+    Returns
+    -------
+    n : `int`, `numpy.ndarray` of `int`
+        the next power of two
+    """
+    return (2 ** numpy.ceil(numpy.log2(x))).astype(int)
+
+
+def fft(data):
+    """Return the one-sided Fourier transform of real time-domain data
+
+    This matches the normalisation of `gwpy.timeseries.TimeSeries.fft`,
+    and the precision of the input, so single-precision data give a
+    `complex64` array.
+
+    Parameters
+    ----------
+    data : `numpy.ndarray`
+        the time-domain data
+
+    Returns
+    -------
+    fdata : `numpy.ndarray`
+        the one-sided frequency-domain data
+    """
+    dtype = numpy.result_type(data.dtype, numpy.complex64)
+    fdata = npfft.rfft(data).astype(dtype, copy=False)
+    fdata /= data.size
+    fdata[1:] *= 2.0
+    return fdata
+
+
+def _interpolate(x, y, xout, axis=-1):
+    """Cubic (or linear, for short arrays) interpolation along one axis
+
+    Output points outside of ``x`` take the value at the nearest edge.
+    """
+    kind = 'cubic' if x.size >= 4 else 'linear'
+    if x.size == 1:
+        return numpy.repeat(y, xout.size, axis=axis)
+    return interp1d(x, y, kind=kind, axis=axis, copy=False,
+                    assume_sorted=True)(numpy.clip(xout, x[0], x[-1]))
+
+
+def _resample(x, y, xout):
+    """Interpolate rows onto a regular grid, keeping the loudest samples
+
+    Only the samples of ``x`` that cover ``xout`` are used, and where ``x``
+    is finer than the spacing of ``xout``, each run of samples within one
+    output step is first reduced to its maximum, so that short transients
+    are not lost on a coarse grid.
+    """
+    step = xout[1] - xout[0] if xout.size > 1 else 0
+    if x.size > 1:
+        # crop to the output grid, with a margin for cubic interpolation
+        dx = x[1] - x[0]
+        factor = max(int(step // dx), 1)
+        first = max(numpy.searchsorted(x, xout[0] - step) - 8 * factor, 0)
+        last = min(numpy.searchsorted(x, xout[-1] + step) + 8 * factor,
+                   x.size)
+        # align runs to the full row, so that any crop gives the same runs
+        first -= first % factor
+        x, y = x[first:last], y[..., first:last]
+        if factor > 1:
+            starts = numpy.arange(0, x.size, factor)
+            counts = numpy.diff(numpy.append(starts, x.size))
+            x = numpy.add.reduceat(x, starts) / counts
+            y = numpy.maximum.reduceat(y, starts, axis=-1)
+    return _interpolate(x, y, xout)
+
+
+def _normalize(energy, norm):
+    """Normalize each row of a 2-D energy array in place
+    """
+    if norm in (True, 'median'):
+        energy /= numpy.median(energy, axis=-1)[..., numpy.newaxis]
+    elif norm == 'mean':
+        energy /= energy.mean(axis=-1, dtype=numpy.float64)[..., numpy.newaxis]
+    elif norm:
+        raise ValueError("Invalid normalisation %r" % norm)
+    return energy
+
+
+def _crop_indices(epoch, dt, size, start, end):
+    """Return the ``(first, last)`` sample indices of a row inside a window
+    """
+    first = int(numpy.ceil((start - epoch) / dt))
+    last = int(numpy.ceil((end - epoch) / dt))
+    return max(first, 0), min(max(last, 0), size)
+
+
+def _divisor_below(n, target):
+    """Return the largest divisor of ``n`` not greater than ``target``
+    """
+    for d in range(min(int(target), n), 1, -1):
+        if not n % d:
+            return d
+    return 1
+
+
+def _update_peak(peak, plane, group, window, first, epoch):
+    """Update a loudest-tile record with a 2-D window of tile energies
+    """
+    row, col = numpy.unravel_index(window.argmax(), window.shape)
+    energy = float(window[row, col])
+    if energy > peak['energy']:
+        return {
+            'energy': energy,
+            'snr': (2 * energy) ** (1/2.),
+            'time': epoch + (first + col) * plane.duration / group.nsamples,
+            'frequency': plane.frequencies[group.rows[row]],
+            'q': plane.q,
+        }
+    return peak
+
+
+def _threaded(func, tasks, nthreads=1):
+    """Map a function over tasks on a thread pool, yielding results in order
+
+    At most ``2 * nthreads`` tasks are evaluated ahead of the consumer, so
+    that memory use is bounded regardless of the number of tasks.
+    """
+    if nthreads <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+    pool = ThreadPool(nthreads)
+    try:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= 2 * nthreads:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def energy_threshold(far, duration, nind):
+    """Return the normalized tile energy corresponding to a white noise
+    false alarm rate
+
+    Parameters
+    ----------
+    far : `float`
+        white noise false alarm rate, in Hertz
+    duration : `float`
+        duration of the analysed data, in seconds
+    nind : `float`
+        number of statistically independent tiles searched
+
+    Returns
+    -------
+    energy : `float`
+        the normalized energy threshold
+    """
+    return -numpy.log(far * duration / (1.5 * nind))
+
+
+# -- frequency-domain data ----------------------------------------------------
+
+class QSpectra(object):
+    """Frequency-domain representations of the data for a single channel
+
+    Each representation (e.g. raw, high-passed, whitened) is registered as
+    time-domain data, and Fourier transformed the first time it is needed;
+    after that, the Q-plane search, eventgrams, and interpolated
+    Q-transforms all share the same spectrum.
+
+    Parameters
+    ----------
+    epoch : `float`
+        the GPS start time of the data
+    duration : `float`
+        duration of the data, in seconds
+    sampling : `float`
+        sample rate of the data, in Hertz
+    **data
+        `(key, array)` pairs of time-domain data, one for each
+        representation, all with the same ``epoch``, ``duration`` and
+        ``sampling``
+
+    Examples
+    --------
+    >>> spectra = QSpectra(wseries.x0.value, abs(wseries.span),
+    ...                    wseries.sample_rate.value, whitened=wseries.value)
+    >>> qgram, peak = find_peak(tiling, spectra['whitened'], spectra.epoch,
+    ...                         gps)
+    """
+    def __init__(self, epoch, duration, sampling, **data):
+        self.epoch = float(epoch)
+        self.duration = float(duration)
+        self.sampling = float(sampling)
+        self._tdata = {}
+        self._fdata = {}
+        for key in data:
+            self.add(key, data[key])
+
+    def add(self, key, data):
+        """Register a new representation of the time-domain data
+
+        Parameters
+        ----------
+        key : `str`
+            the name of this representation
+        data : `numpy.ndarray`
+            the time-domain data
+        """
+        data = numpy.asarray(data)
+        if data.size != int(round(self.duration * self.sampling)):
+            raise ValueError("Cannot add %r data with %d samples to %s "
+                             "seconds at %s Hz" % (key, data.size,
+                                                   self.duration,
+                                                   self.sampling))
+        self._tdata[key] = data
+        self._fdata.pop(key, None)
+
+    def keys(self):
+        return list(self._tdata.keys())
+
+    def __contains__(self, key):
+        return key in self._tdata
+
+    def __getitem__(self, key):
+        """Return the one-sided spectrum of a given representation
+        """
+        try:
+            return self._fdata[key]
+        except KeyError:
+            self._fdata[key] = fft(self._tdata[key])
+            return self._fdata[key]
+
+    def transform(self, plane, key, norm=True):
+        """Compute the Q-transform of one representation in a given plane
+
+        Parameters
+        ----------
+        plane : `QPlane`
+            the Q-plane to evaluate
+        key : `str`
+            the name of the representation to transform
+        norm : `bool`, `str`, optional
+            normalisation for each row, see `QRows.energy`
+
+        Returns
+        -------
+        qgram : `QGram`
+            the normalized tile energies
+        """
+        return plane.transform(self[key], epoch=self.epoch, norm=norm)
+
+
+# -- tiling -------------------------------------------------------------------
+
+class QRows(object):
+    """A set of rows of a `QPlane` that share the same number of tiles
+
+    This is the unit of vectorisation: all rows in a `QRows` are
+    inverse-Fourier transformed together as one 2-D array.
+
+    Parameters
+    ----------
+    rows : `numpy.ndarray` of `int`
+        the indices of these rows in the parent `QPlane`
+    nsamples : `int`
+        the number of time samples (tiles) in each row
+    windows : `list` of `numpy.ndarray`
+        the bi-square window for each row
+    indices : `list` of `numpy.ndarray`
+        the frequency-domain sample indices for each row
+    """
+    def __init__(self, rows, nsamples, windows, indices):
+        self.rows = numpy.asarray(rows)
+        self.nsamples = int(nsamples)
+        self._sizes = numpy.array([w.size for w in windows], dtype=int)
+        self._dataidx = numpy.concatenate(indices)
+        self._window = numpy.concatenate(windows)
+        self._set_positions()
+
+    def _set_positions(self):
+        """Set the row and column positions of each windowed sample
+
+        These are the positions after padding each row to `nsamples` and
+        moving negative frequencies to the end.
+        """
+        sizes, nsamp = self._sizes, self.nsamples
+        offsets = numpy.repeat(numpy.cumsum(sizes) - sizes, sizes)
+        shifts = numpy.repeat(
+            numpy.trunc((nsamp - sizes - 1) / 2.).astype(int) - nsamp // 2,
+            sizes)
+        self._rowidx = numpy.repeat(numpy.arange(sizes.size), sizes)
+        self._colidx = (numpy.arange(sizes.sum()) - offsets + shifts) % nsamp
+
+    def __getstate__(self):
+        # the sample positions are cheaper to recompute than to store
+        state = self.__dict__.copy()
+        del state['_rowidx'], state['_colidx']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._set_positions()
+
+    def __len__(self):
+        return self.rows.size
+
+    def windowed(self, fdata):
+        """Return the padded, windowed frequency-domain data for these rows
+
+        Parameters
+        ----------
+        fdata : `numpy.ndarray`
+            the one-sided frequency-domain data
+
+        Returns
+        -------
+        windowed : `numpy.ndarray`
+            a 2-D complex array of shape ``(len(self), self.nsamples)``,
+            with the precision of ``fdata``
+        """
+        out = numpy.zeros((len(self), self.nsamples), dtype=fdata.dtype)
+        out[self._rowidx, self._colidx] = (
+            fdata[self._dataidx] *
+            self._window.astype(out.real.dtype, copy=False))
+        return out
+
+    def energy(self, fdata, norm=True):
+        """Compute the (normalized) tile energies of these rows
+
+        Parameters
+        ----------
+        fdata : `numpy.ndarray`
+            the one-sided frequency-domain data
+        norm : `bool`, `str`, optional
+            normalisation for each row, one of `'median'` (or `True`),
+            `'mean'`, or `False`
+
+        Returns
+        -------
+        energy : `numpy.ndarray`
+            a 2-D array of shape ``(len(self), self.nsamples)``
+        """
+        windowed = self.windowed(fdata)
+        tdenergy = npfft.ifft(windowed, axis=-1).astype(windowed.dtype,
+                                                         copy=False)
+        energy = tdenergy.real ** 2 + tdenergy.imag ** 2
+        return _normalize(energy, norm)
+
+    def window_energy(self, fdata, first, last, norm=True, nmedian=4096):
+        """Compute the tile energies of these rows for a range of samples
+
+        Only the output samples ``first <= i < last`` are converted to
+        energy and kept; the normalisation of each row is estimated from
+        a decimated subset of its samples, computed directly by folding
+        the windowed frequency-domain data, so the full row of energies
+        is never formed.
+
+        Parameters
+        ----------
+        fdata : `numpy.ndarray`
+            the one-sided frequency-domain data
+        first : `int`
+            index of the first output sample
+        last : `int`
+            index after the last output sample
+        norm : `bool`, `str`, optional
+            normalisation for each row, see `QRows.energy`
+        nmedian : `int`, optional
+            maximum number of equally spaced samples per row used to
+            estimate the median energy, the estimate is exact for rows
+            with no more than this many samples
+
+        Returns
+        -------
+        energy : `numpy.ndarray`
+            a 2-D array of shape ``(len(self), last - first)``
+
+        Notes
+        -----
+        For `'mean'` normalisation the row mean is computed exactly in the
+        frequency domain, using Parseval's theorem.
+        """
+        nrows, nsamp = len(self), self.nsamples
+        windowed = self.windowed(fdata)
+        tdenergy = npfft.ifft(windowed, axis=-1)[:, first:last].astype(
+            windowed.dtype, copy=False)
+        energy = tdenergy.real ** 2 + tdenergy.imag ** 2
+        if norm in (True, 'median'):
+            # every (nsamp / nsub)-th sample, from the folded spectrum
+            nsub = _divisor_below(nsamp, nmedian)
+            folded = windowed.reshape(nrows, nsamp // nsub, nsub).sum(axis=1)
+            subsample = npfft.ifft(folded, axis=-1).astype(
+                windowed.dtype, copy=False) * (nsub / nsamp)
+            energy /= numpy.median(
+                subsample.real ** 2 + subsample.imag ** 2,
+                axis=-1)[:, numpy.newaxis]
+        elif norm == 'mean':
+            energy /= (abs(windowed) ** 2).sum(
+                axis=-1, dtype=numpy.float64)[:, numpy.newaxis] / nsamp ** 2
+        elif norm:
+            raise ValueError("Invalid normalisation %r" % norm)
+        return energy
+
+
+class QPlane(object):
+    """A single Q-plane of a time-frequency tiling
+
+    Parameters
+    ----------
+    q : `float`
+        the Q of this plane
+    frange : `tuple` of `float`
+        `(low, high)` range of frequencies for this plane
+    duration : `float`
+        duration of the data, in seconds
+    sampling : `float`
+        sample rate of the data, in Hertz
+    mismatch : `float`, optional
+        maximum fractional mismatch between neighbouring tiles
+    multirate : `bool`, optional
+        if `True`, evaluate each row with the shortest fast FFT length that
+        holds its bandwidth, rather than with one sample per tile, see
+        the notes below
+    band : `tuple` of `float`, optional
+        `(low, high)` range of frequencies outside which rows are left out
+        of `groups`, so that they are not evaluated by `transform` or
+        `peak`; the rows that are kept are identical to those of the
+        full plane, but such a plane cannot be interpolated
+
+    Notes
+    -----
+    By default, each row has `ntiles` time samples, a power of two chosen
+    so that neighbouring tiles in time satisfy the ``mismatch``. In
+    multi-rate mode, each row is instead sampled at the lowest rate that
+    represents it without aliasing, which is the window support of the row
+    rounded up to the next fast FFT length. This is typically half as many
+    samples as `ntiles`. The tile energies are unchanged, as the window
+    normalisation follows the number of samples, but they are sampled more
+    coarsely in time, so the loudest tile may be slightly underestimated.
+    """
+    def __init__(self, q, frange, duration, sampling, mismatch=0.2,
+                 multirate=False, band=None):
+        self.q = float(q)
+        self.frange = [float(frange[0]), float(frange[1])]
+        self.duration = float(duration)
+        self.sampling = float(sampling)
+        self.mismatch = float(mismatch)
+        self.multirate = bool(multirate)
+        if self.frange[0] == 0:  # set non-zero lower frequency
+            self.frange[0] = 50 * self.q / (2 * numpy.pi * self.duration)
+        if numpy.isinf(self.frange[1]):  # set non-infinite upper frequency
+            self.frange[1] = self.sampling / 2 / (1 + 1 / self.qprime)
+
+        # frequency rows, equally spaced in log-frequency, with row edges
+        # at the geometric boundaries between neighbouring rows
+        minf, maxf = self.frange
+        scale = 2 / (2 + self.q ** 2) ** (1/2.)
+        fcum = numpy.log(maxf / minf) / scale
+        nfreq = int(max(1, numpy.ceil(fcum / self.deltam)))
+        fstep = fcum / nfreq
+        fstepmin = 1 / self.duration
+        self.frequencies = (
+            minf * numpy.exp(scale * (numpy.arange(nfreq) + .5) * fstep) //
+            fstepmin * fstepmin)
+        self.fedges = minf * numpy.exp(scale * numpy.arange(nfreq + 1) *
+                                       fstep)
+
+        # tiles per row, samples per row, and grouping of rows with equal
+        # sample counts
+        self.ntiles = next_power_of_two(
+            self.duration * 2 * numpy.pi * self.frequencies / self.q /
+            self.deltam)
+        if self.multirate:
+            self.nsamples = numpy.array([
+                next_fast_len(2 * self._half_window(i) + 1) for
+                i in range(nfreq)])
+        else:
+            self.nsamples = self.ntiles
+        keep = numpy.ones(nfreq, dtype=bool)
+        if band is not None:
+            keep &= (self.fedges[1:] > band[0]) & (self.fedges[:-1] < band[1])
+        self.groups = []
+        for n in numpy.unique(self.nsamples[keep]):
+            rows = numpy.nonzero((self.nsamples == n) & keep)[0]
+            self.groups.append(QRows(
+                rows, n,
+                [self._window(i) for i in rows],
+                [self._data_indices(i) for i in rows]))
+
+    @property
+    def deltam(self):
+        """Fractional mismatch between neighbouring tiles
+        """
+        return 2 * (self.mismatch / 3.) ** (1/2.)
+
+    @property
+    def qprime(self):
+        """Normalized Q of this plane
+        """
+        return self.q / 11 ** (1/2.)
+
+    @property
+    def bandwidths(self):
+        """Frequency extent of each row, for tiled display
+        """
+        return numpy.diff(self.fedges)
+
+    @property
+    def nind(self):
+        """Number of statistically independent tiles in this plane
+        """
+        return (1 + 2 * numpy.pi * self.duration * self.frequencies /
+                self.q).sum()
+
+    def __len__(self):
+        return self.frequencies.size
+
+    def _half_window(self, row):
+        return int(self.frequencies[row] / self.qprime * self.duration)
+
+    def _window(self, row):
+        """Return the bi-square window for a given row
+        """
+        freq = self.frequencies[row]
+        half = self._half_window(row)
+        xfrequencies = (numpy.arange(-half, half + 1) / self.duration *
+                        self.qprime / freq)
+        norm = self.nsamples[row] / (self.duration * self.sampling) * (
+            315 * self.qprime / (128 * freq)) ** (1/2.)
+        return (1 - xfrequencies ** 2) ** 2 * norm
+
+    def _data_indices(self, row):
+        """Return the frequency-domain sample indices for a given row
+        """
+        half = self._half_window(row)
+        return numpy.round(numpy.arange(-half, half + 1) + 1 +
+                           self.frequencies[row] * self.duration).astype(int)
+
+    def transform(self, fdata, epoch=0, norm=True):
+        """Compute the normalized tile energies of this plane
+
+        Parameters
+        ----------
+        fdata : `numpy.ndarray`
+            the one-sided frequency-domain data
+        epoch : `float`, optional
+            the GPS start time of the data
+        norm : `bool`, `str`, optional
+            normalisation for each row, see `QRows.energy`
+
+        Returns
+        -------
+        qgram : `QGram`
+            the normalized tile energies
+        """
+        return QGram(self, [group.energy(fdata, norm=norm) for
+                            group in self.groups], epoch=epoch)
+
+    def peak(self, fdata, start, end, epoch=0, norm=True, nmedian=4096):
+        """Find the loudest tile of this plane in a given time window
+
+        Unlike `QPlane.transform`, only the tiles inside the window are
+        evaluated, see `QRows.window_energy` for details.
+
+        Parameters
+        ----------
+        fdata : `numpy.ndarray`
+            the one-sided frequency-domain data
+        start : `float`
+            GPS start time of the window
+        end : `float`
+            GPS end time of the window
+        epoch : `float`, optional
+            the GPS start time of the data
+        norm : `bool`, `str`, optional
+            normalisation for each row, see `QRows.energy`
+        nmedian : `int`, optional
+            maximum number of samples per row used to estimate the median
+            energy, see `QRows.window_energy`
+
+        Returns
+        -------
+        peak : `dict`
+            the ``'energy'``, ``'snr'``, ``'time'``, ``'frequency'``, and
+            ``'q'`` of the loudest tile, ``'energy'`` is zero if there are
+            no tiles in this window
+        """
+        peak = {'energy': 0}
+        for group in self.groups:
+            peak = self._group_peak(peak, group, fdata, start, end,
+                                    epoch=epoch, norm=norm, nmedian=nmedian)
+        return peak
+
+    def _group_peak(self, peak, group, fdata, start, end, epoch=0, norm=True,
+                    nmedian=4096):
+        """Update a loudest-tile record with one row group of this plane
+        """
+        dt = self.duration / group.nsamples
+        first, last = _crop_indices(epoch, dt, group.nsamples, start, end)
+        if last <= first:
+            return peak
+        window = group.window_energy(fdata, first, last, norm=norm,
+                                     nmedian=nmedian)
+        return _update_peak(peak, self, group, window, first, epoch)
+
+
+class QGram(object):
+    """Normalized tile energies of a single `QPlane`
+
+    Parameters
+    ----------
+    plane : `QPlane`
+        the Q-plane that was evaluated
+    energies : `list` of `numpy.ndarray`
+        the 2-D energy array for each of ``plane.groups``, in order
+    epoch : `float`, optional
+        the GPS start time of the data
+    """
+    def __init__(self, plane, energies, epoch=0):
+        self.plane = plane
+        self.energies = energies
+        self.epoch = float(epoch)
+
+    def __iter__(self):
+        """Iterate over ``(group, energy)`` pairs, by increasing frequency
+        """
+        return iter(zip(self.plane.groups, self.energies))
+
+    def times(self, group):
+        """Return the central times of tiles in a given row group
+        """
+        return self.epoch + (numpy.arange(group.nsamples) *
+                             self.plane.duration / group.nsamples)
+
+    def peak(self, start, end):
+        """Find the loudest tile in a given time window
+
+        Parameters
+        ----------
+        start : `float`
+            GPS start time of the window
+        end : `float`
+            GPS end time of the window
+
+        Returns
+        -------
+        peak : `dict`
+            the ``'energy'``, ``'snr'``, ``'time'``, ``'frequency'``, and
+            ``'q'`` of the loudest tile, ``'energy'`` is zero if there are
+            no tiles in this window
+        """
+        peak = {'energy': 0}
+        for group, energy in self:
+            dt = self.plane.duration / group.nsamples
+            first, last = _crop_indices(self.epoch, dt, group.nsamples,
+                                        start, end)
+            if last <= first:
+                continue
+            peak = _update_peak(peak, self.plane, group,
+                                energy[:, first:last], first, self.epoch)
+        return peak
+
+    def interpolate(self, tres, fres=None, outseg=None, logf=False,
+                    frequencies=None):
+        """Interpolate this `QGram` onto a regular time-frequency grid
+
+        Parameters
+        ----------
+        tres : `float`
+            desired time resolution, in seconds
+        fres : `float`, optional
+            desired frequency resolution, in Hertz, default is to return
+            the native frequency rows of this plane
+        outseg : `tuple` of `float`, optional
+            GPS `[start, stop)` segment for the output, default is the full
+            duration of the data
+        logf : `bool`, optional
+            if `True`, space output frequencies logarithmically, with as
+            many frequencies as a linear grid at ``fres``
+        frequencies : `numpy.ndarray`, optional
+            the output frequencies, overriding ``fres`` and ``logf``
+
+        Returns
+        -------
+        times : `numpy.ndarray`
+            the output GPS times
+        frequencies : `numpy.ndarray`
+            the output frequencies
+        values : `numpy.ndarray`
+            the interpolated energies, with shape
+            ``(times.size, frequencies.size)``
+
+        Notes
+        -----
+        Only tiles within ``outseg`` are interpolated, so the cost scales
+        with the output rather than the full plane. Where tiles are finer
+        than ``tres``, each output time takes the loudest tile near it.
+        """
+        if outseg is None:
+            outseg = (self.epoch, self.epoch + self.plane.duration)
+        # a span that is a multiple of tres gives exactly that many times,
+        # whatever the rounding of the division
+        ntime = int(numpy.ceil(numpy.around(
+            (outseg[1] - outseg[0]) / tres, 6)))
+        xout = outseg[0] + tres * numpy.arange(ntime)
+        dtype = numpy.result_type(numpy.float32, *self.energies)
+        rows = numpy.empty((len(self.plane), xout.size), dtype=dtype)
+        for group, energy in self:
+            rows[group.rows] = _resample(self.times(group), energy, xout)
+        freqs = self.plane.frequencies
+        if frequencies is None and fres is None:
+            return xout, freqs, rows.T
+        fmin, fmax = self.plane.frange
+        if frequencies is not None:
+            outfreq = numpy.asarray(frequencies, dtype=float)
+        elif logf:
+            nfreq = int((fmax - fmin) // fres)
+            outfreq = numpy.logspace(numpy.log10(fmin), numpy.log10(fmax),
+                                     num=nfreq, endpoint=False)
+        else:
+            outfreq = numpy.arange(fmin, fmax, fres)
+        values = _interpolate(freqs, rows, outfreq, axis=0)
+        return xout, outfreq, values.astype(dtype, copy=False).T
+
+
+# -- cache --------------------------------------------------------------------
+
+class PlaneCache(object):
+    """Least-recently-used cache of `QPlane` objects, optionally on disk
+
+    Building a `QPlane` evaluates the frequency rows, bisquare windows,
+    and sample indices of every row, which depend only on the parameters
+    of the plane, so planes are shared by all channels and scans with the
+    same duration, sample rate, and ranges.
+
+    Parameters
+    ----------
+    maxsize : `int`, optional
+        the maximum number of planes held in memory
+    cachedir : `str`, optional
+        directory in which to store planes between processes, default is
+        to cache in memory only
+    """
+    def __init__(self, maxsize=32, cachedir=None):
+        self.maxsize = int(maxsize)
+        self.cachedir = cachedir
+        self._planes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._planes)
+
+    def clear(self):
+        """Remove all planes held in memory
+        """
+        with self._lock:
+            self._planes.clear()
+
+    def _path(self, key):
+        """Return the on-disk path of the plane with the given key
+        """
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, 'qplane-%s.pkl' % digest)
+
+    def _load(self, key):
+        """Read a plane from disk, returning `None` if it is not found
+        """
+        try:
+            with open(self._path(key), 'rb') as fobj:
+                return pickle.load(fobj)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _save(self, key, plane):
+        """Write a plane to disk, atomically
+        """
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+        fdesc, tmp = tempfile.mkstemp(dir=self.cachedir, suffix='.tmp')
+        with os.fdopen(fdesc, 'wb') as fobj:
+            pickle.dump(plane, fobj, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self._path(key))
+
+    def get(self, q, frange, duration, sampling, mismatch=0.2,
+            multirate=False, band=None):
+        """Return the `QPlane` with the given parameters
+
+        The arguments are as for `QPlane`. A plane that is not held in
+        memory is read from ``cachedir``, if given, or else created (and
+        written to ``cachedir``).
+        """
+        key = (float(q), tuple(float(f) for f in frange), float(duration),
+               float(sampling), float(mismatch), bool(multirate),
+               None if band is None else tuple(float(f) for f in band))
+        with self._lock:
+            plane = self._planes.pop(key, None)
+            if plane is not None:  # move to the most-recently-used end
+                self._planes[key] = plane
+                return plane
+        if self.cachedir is not None:
+            plane = self._load(key)
+        if plane is None:
+            plane = QPlane(q, frange, duration, sampling, mismatch=mismatch,
+                           multirate=multirate, band=band)
+            if self.cachedir is not None:
+                self._save(key, plane)
+        with self._lock:
+            self._planes[key] = plane
+            while len(self._planes) > self.maxsize:
+                self._planes.popitem(last=False)
+        return plane
+
+
+# the default cache, shared by all tilings in this process
+PLANE_CACHE = PlaneCache()
+
+
+def get_plane(q, frange, duration, sampling, mismatch=0.2, multirate=False,
+              band=None):
+    """Return a `QPlane` from the default `PLANE_CACHE`
+
+    The arguments are as for `QPlane`.
+    """
+    return PLANE_CACHE.get(q, frange, duration, sampling, mismatch=mismatch,
+                           multirate=multirate, band=band)
+
+
+class QTiling(object):
+    """Iterable tiling of the time-frequency plane into `QPlane` objects
+
+    Parameters
+    ----------
+    duration : `float`
+        duration of the data, in seconds
+    sampling : `float`
+        sample rate of the data, in Hertz
+    qrange : `tuple` of `float`, optional
+        `(low, high)` range of Qs to scan
+    frange : `tuple` of `float`, optional
+        `(low, high)` range of frequencies to scan
+    mismatch : `float`, optional
+        maximum fractional mismatch between neighbouring tiles
+    multirate : `bool`, optional
+        if `True`, evaluate each row at the lowest rate for its bandwidth,
+        see `QPlane` for details
+    """
+    def __init__(self, duration, sampling, qrange=(4, 64),
+                 frange=(0, numpy.inf), mismatch=0.2, multirate=False):
+        self.duration = float(duration)
+        self.sampling = float(sampling)
+        self.qrange = (float(qrange[0]), float(qrange[1]))
+        self.frange = [float(frange[0]), float(frange[1])]
+        self.mismatch = float(mismatch)
+        self.multirate = bool(multirate)
+
+        # Q-planes, equally spaced in log-Q
+        cumum = numpy.log(self.qrange[1] / self.qrange[0]) / 2 ** (1/2.)
+        nplanes = int(max(numpy.ceil(cumum / self.deltam), 1))
+        dq = cumum / nplanes
+        self.qs = self.qrange[0] * numpy.exp(
+            2 ** (1/2.) * dq * (numpy.arange(nplanes) + .5))
+
+        if self.frange[0] == 0:  # set non-zero lower frequency
+            self.frange[0] = 50 * self.qs.max() / (2 * numpy.pi *
+                                                   self.duration)
+        maxf = self.sampling / 2 / (1 + 11 ** (1/2.) / self.qs.min())
+        if numpy.isinf(self.frange[1]):
+            self.frange[1] = maxf
+        elif self.frange[1] > maxf:  # truncate upper frequency to maximum
+            warnings.warn('upper frequency of %.2f is too high for the given '
+                          'Q range, resetting to %.2f'
+                          % (self.frange[1], maxf))
+            self.frange[1] = maxf
+
+    @property
+    def deltam(self):
+        """Fractional mismatch between neighbouring tiles
+        """
+        return 2 * (self.mismatch / 3.) ** (1/2.)
+
+    @property
+    def nind(self):
+        """Number of statistically independent tiles in this tiling
+
+        This uses the plane weighting of the original per-plane accumulation
+        in ``gwdetchar-omega``, in which the running tile count is divided by
+        the running plane count after each plane.
+        """
+        weight = 1 + numpy.log10(self.qrange[1] / self.qrange[0]) / (
+            2 ** (1/2.))
+        counts = numpy.array([plane.nind for plane in self])
+        return weight * (counts / numpy.arange(1, counts.size + 1)).sum()
+
+    def __len__(self):
+        return self.qs.size
+
+    def __iter__(self):
+        for q in self.qs:
+            yield get_plane(q, self.frange, self.duration, self.sampling,
+                            mismatch=self.mismatch, multirate=self.multirate)
+
+
+# -- search -------------------------------------------------------------------
+
+def _plane_groups(tiling):
+    """Yield each ``(plane, group)`` pair of a tiling, in order
+    """
+    for plane in tiling:
+        for group in plane.groups:
+            yield plane, group
+
+
+def find_peak(tiling, fdata, epoch, gps, search=0.5, norm=True, nthreads=1):
+    """Find the loudest tile near a given time over all planes of a tiling
+
+    Parameters
+    ----------
+    tiling : `QTiling`
+        the tiling to search
+    fdata : `numpy.ndarray`
+        the one-sided frequency-domain data
+    epoch : `float`
+        the GPS start time of the data
+    gps : `float`
+        central GPS time of the search
+    search : `float`, optional
+        duration of the search window, centred on ``gps``
+    norm : `bool`, `str`, optional
+        normalisation for each row, see `QRows.energy`
+    nthreads : `int`, optional
+        number of threads with which to evaluate the row groups of all
+        planes in parallel, the result does not depend on this number
+
+    Returns
+    -------
+    qgram : `QGram`
+        the tile energies of the Q-plane containing the loudest tile
+    peak : `dict`
+        the ``'energy'``, ``'snr'``, ``'time'``, ``'frequency'``, and ``'q'``
+        of the loudest tile
+
+    Raises
+    ------
+    NoPeakError
+        if no tile in the search window has positive energy
+    """
+    start, end = gps - search / 2., gps + search / 2.
+
+    def _evaluate(task):
+        plane, group = task
+        return plane, group.energy(fdata, norm=norm)
+
+    # gather the energies of each plane in turn, and keep the loudest
+    qgram, peak = None, {'energy': 0}
+    plane, energies = None, []
+    results = _threaded(_evaluate, _plane_groups(tiling), nthreads=nthreads)
+    for gplane, energy in chain(results, [(None, None)]):
+        if gplane is not plane and plane is not None:
+            result = QGram(plane, energies, epoch=epoch)
+            ppeak = result.peak(start, end)
+            if ppeak['energy'] > peak['energy']:
+                qgram, peak = result, ppeak
+            energies = []
+        plane = gplane
+        energies.append(energy)
+    if qgram is None:
+        raise NoPeakError("No tile with positive energy found within "
+                         "%s seconds of %s" % (search / 2., gps))
+    return qgram, peak
+
+
+def find_loudest_plane(tiling, fdata, epoch, gps, search=0.5, norm=True,
+                       nmedian=4096, nthreads=1):
+    """Rank all planes of a tiling by their loudest tile near a given time
+
+    This is a significance-only alternative to `find_peak`: only the tiles
+    inside the search window are evaluated, so the cost of each plane is
+    a fraction of a full transform. The caller is expected to run
+    `QPlane.transform` only for the winning plane, if at all.
+
+    Parameters
+    ----------
+    tiling : `QTiling`, or iterable of `QPlane`
+        the tiling to search
+    fdata : `numpy.ndarray`
+        the one-sided frequency-domain data
+    epoch : `float`
+        the GPS start time of the data
+    gps : `float`
+        central GPS time of the search
+    search : `float`, optional
+        duration of the search window, centred on ``gps``
+    norm : `bool`, `str`, optional
+        normalisation for each row, see `QRows.energy`
+    nmedian : `int`, optional
+        maximum number of samples per row used to estimate the median
+        energy, see `QRows.window_energy`
+    nthreads : `int`, optional
+        number of threads with which to evaluate the row groups of all
+        planes in parallel, the result does not depend on this number
+
+    Returns
+    -------
+    plane : `QPlane`
+        the Q-plane containing the loudest tile
+    peak : `dict`
+        the ``'energy'``, ``'snr'``, ``'time'``, ``'frequency'``, and ``'q'``
+        of the loudest tile
+
+    Raises
+    ------
+    NoPeakError
+        if no tile in the search window has positive energy
+    """
+    start, end = gps - search / 2., gps + search / 2.
+
+    def _evaluate(task):
+        plane, group = task
+        return plane, plane._group_peak(
+            {'energy': 0}, group, fdata, start, end, epoch=epoch, norm=norm,
+            nmedian=nmedian)
+
+    peakplane, peak = None, {'energy': 0}
+    for plane, gpeak in _threaded(_evaluate, _plane_groups(tiling),
+                                  nthreads=nthreads):
+        if gpeak['energy'] > peak['energy']:
+            peakplane, peak = plane, gpeak
+    if peakplane is None:
+        raise NoPeakError("No tile with positive energy found within "
+                         "%s seconds of %s" % (search / 2., gps))
+    return peakplane, peak
+
+
+def hierarchical_search(tiling, fdata, epoch, gps, coarse=0.6, search=0.5,
+                        norm=True, nmedian=4096, nthreads=1):
+    """Find the Q-plane containing the loudest tile by coarse-to-fine search
+
+    The whole parameter space is first searched with a coarse tiling, with
+    maximum mismatch ``coarse``, then re-tiled at ``tiling.mismatch`` only
+    in the Q-planes and the frequency band adjacent to the coarse maximum.
+    Only the tiles inside the search window are evaluated at either stage,
+    as in `find_loudest_plane`.
+
+    Parameters
+    ----------
+    tiling : `QTiling`
+        the tiling to search
+    fdata : `numpy.ndarray`
+        the one-sided frequency-domain data
+    epoch : `float`
+        the GPS start time of the data
+    gps : `float`
+        central GPS time of the search
+    coarse : `float`, optional
+        maximum fractional mismatch of the coarse tiling, between
+        ``tiling.mismatch`` and 1
+    search : `float`, optional
+        duration of the search window, centred on ``gps``
+    norm : `bool`, `str`, optional
+        normalisation for each row, see `QRows.energy`
+    nmedian : `int`, optional
+        maximum number of samples per row used to estimate the median
+        energy, see `QRows.window_energy`
+    nthreads : `int`, optional
+        number of threads with which to evaluate row groups in parallel
+
+    Returns
+    -------
+    plane : `QPlane`
+        the full-band Q-plane of ``tiling`` containing the loudest tile
+    peak : `dict`
+        the ``'energy'``, ``'snr'``, ``'time'``, ``'frequency'``, and ``'q'``
+        of the loudest tile
+
+    Raises
+    ------
+    ValueError
+        if ``coarse`` is not in the range ``[tiling.mismatch, 1)``
+    NoPeakError
+        if no tile in the search window has positive energy
+    """
+    if not tiling.mismatch <= coarse < 1:
+        raise ValueError("Coarse mismatch must be in the range "
+                         "[%s, 1), not %s" % (tiling.mismatch, coarse))
+    ctiling = QTiling(tiling.duration, tiling.sampling, qrange=tiling.qrange,
+                      frange=tiling.frange, mismatch=coarse, multirate=True)
+    cplane, cpeak = find_loudest_plane(ctiling, fdata, epoch, gps,
+                                       search=search, norm=norm,
+                                       nmedian=nmedian, nthreads=nthreads)
+
+    # Q-planes within one coarse step of the coarse maximum
+    qstep = numpy.log(tiling.qrange[1] / tiling.qrange[0]) / len(ctiling)
+    qs = tiling.qs[abs(numpy.log(tiling.qs / cplane.q)) <= qstep]
+    if not qs.size:  # the nearest fine plane
+        qs = tiling.qs[[abs(numpy.log(tiling.qs / cplane.q)).argmin()]]
+
+    # frequency band covered by the coarse rows adjacent to the maximum
+    row = abs(cplane.frequencies - cpeak['frequency']).argmin()
+    band = (cplane.fedges[max(row - 1, 0)],
+            cplane.fedges[min(row + 2, len(cplane))])
+    planes = [get_plane(q, tiling.frange, tiling.duration, tiling.sampling,
+                        mismatch=tiling.mismatch, multirate=tiling.multirate,
+                        band=band) for q in qs]
+    plane, peak = find_loudest_plane(planes, fdata, epoch, gps,
+                                     search=search, norm=norm,
+                                     nmedian=nmedian, nthreads=nthreads)
+    return get_plane(plane.q, tiling.frange, tiling.duration, tiling.sampling,
+                     mismatch=tiling.mismatch,
+                     multirate=tiling.multirate), peak
+
+
+def prescreen(tiling, fdata, epoch, gps, mismatch=0.6, search=0.5,
+              norm=True, nmedian=4096):
+    """Estimate an upper bound on the loudest tile energy of a tiling
+
+    The bound is computed cheaply from a coarse tiling of the same
+    parameter space, with a much larger ``mismatch``, evaluated only inside
+    the search window. A signal loses at most a fraction ``mismatch`` of its
+    energy to the coarse tile nearest to it, so the loudest coarse tile
+    energy divided by ``1 - mismatch`` bounds what the full search can find.
+
+    Parameters
+    ----------
+    tiling : `QTiling`
+        the full tiling whose loudest tile energy is to be bounded
+    fdata : `numpy.ndarray`
+        the one-sided frequency-domain data
+    epoch : `float`
+        the GPS start time of the data
+    gps : `float`
+        central GPS time of the search
+    mismatch : `float`, optional
+        maximum fractional mismatch of the coarse tiling, between
+        ``tiling.mismatch`` and 1
+    search : `float`, optional
+        duration of the search window, centred on ``gps``
+    norm : `bool`, `str`, optional
+        normalisation for each row, see `QRows.energy`
+    nmedian : `int`, optional
+        maximum number of samples per row used to estimate the median
+        energy, see `QRows.window_energy`
+
+    Returns
+    -------
+    energy : `float`
+        the estimated upper bound on the loudest normalised tile energy,
+        or zero if no coarse tile has positive energy
+
+    Raises
+    ------
+    ValueError
+        if ``mismatch`` is not in the range ``[tiling.mismatch, 1)``
+    """
+    if not tiling.mismatch <= mismatch < 1:
+        raise ValueError("Pre-screen mismatch must be in the range "
+                         "[%s, 1), not %s" % (tiling.mismatch, mismatch))
+    coarse = QTiling(tiling.duration, tiling.sampling, qrange=tiling.qrange,
+                     frange=tiling.frange, mismatch=mismatch, multirate=True)
+    try:
+        _, peak = find_loudest_plane(coarse, fdata, epoch, gps, search=search,
+                                     norm=norm, nmedian=nmedian)
+    except NoPeakError:
+        return 0.
+    return peak['energy'] / (1. - mismatch)
+
+
+def eventgram(qgram, snrthresh=5.5):
+    """Return all tiles in a `QGram` louder than a given SNR threshold
+
+    Parameters
+    ----------
+    qgram : `QGram`
+        the tile energies to threshold
+    snrthresh : `float`, optional
+        threshold on tile SNR, tiles quieter than this are not included
+
+    Returns
+    -------
+    tiles : `numpy.ndarray`
+        a structured array with dtype `TILE_DTYPE`, ordered by frequency
+        and then by time
+    """
+    plane = qgram.plane
+    ethresh = snrthresh ** 2 / 2.
+    bandwidths = plane.bandwidths
+    out = []
+    for group, energy in qgram:
+        mask = energy >= ethresh
+        rows, cols = numpy.nonzero(mask)
+        dt = plane.duration / group.nsamples
+        tiles = numpy.empty(rows.size, dtype=TILE_DTYPE)
+        tiles['central_time'] = qgram.epoch + cols * dt
+        tiles['central_freq'] = plane.frequencies[group.rows[rows]]
+        tiles['duration'] = dt
+        tiles['bandwidth'] = bandwidths[group.rows[rows]]
+        tiles['energy'] = energy[mask]
+        out.append(tiles)
+    return numpy.concatenate(out)
@@ -23,6 +23,7 @@ from __future__ import division
 
 import os
 import sys
+import json
 import datetime
 import subprocess
 from functools import wraps
@@ -36,8 +37,10 @@ from pkg_resources import resource_filename
 from glue import markup
 from gwpy.time import tconvert
 from gwpy.plotter.colors import GW_OBSERVATORY_COLORS
-from ..io.html import (JQUERY_JS, BOOTSTRAP_CSS, BOOTSTRAP_JS)
+from ..io.html import (JQUERY_JS, BOOTSTRAP_CSS, BOOTSTRAP_JS,
+                       thumbnail_path)
 from .. import __version__
+from .viewer import data_filename
 
 __author__ = 'Alex Urban <alexander.urban@ligo.org>'
 __credit__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
@@ -369,7 +372,7 @@ def html_link(href, txt, target="_blank", **params):
     return markup.oneliner.a(txt, href=href, **params)
 
 
-def toggle_link(plottype, channel, pranges):
+def toggle_link(plottype, channel, pranges, interactive=False):
     """Create a Bootstrap button object that toggles between plot types.
 
     Parameters
@@ -380,8 +383,9 @@ def toggle_link(plottype, channel, pranges):
         the channel object corresponding to the plots shown
     pranges : `list` of `int`s
         a list of ranges for the time axis of each plot
-    context : `str`
-        the Bootstrap context that controls color-coding
+    interactive : `bool`, optional
+        whether to redraw the in-browser viewer rather than swap images,
+        default: `False`
 
     Returns
     -------
@@ -391,11 +395,17 @@ def toggle_link(plottype, channel, pranges):
     text = plottype.split('_')[1]
     pstrings = ["'%s'" % p for p in pranges]
     chanstring = channel.name.replace('-', '_').replace(':', '-')
+    if interactive:
+        return markup.oneliner.a(
+            '<b>%s</b>' % text, class_='dropdown-item',
+            onclick="showOmegaView('{0}', '{1}');".format(
+                chanstring, plottype))
     captions = [p.caption for p in channel.plots[plottype]]
+    ext = os.path.splitext(str(channel.plots[plottype][0]))[1][1:]
     return markup.oneliner.a(
         '<b>%s</b>' % text, class_='dropdown-item',
-        onclick="showImage('{0}', [{1}], '{2}', {3});".format(
-            chanstring, ','.join(pstrings), plottype, captions))
+        onclick="showImage('{0}', [{1}], '{2}', {3}, '{4}');".format(
+            chanstring, ','.join(pstrings), plottype, captions, ext))
 
 
 def cis_link(channel, **params):
@@ -447,6 +457,8 @@ def fancybox_img(img, linkparams=dict(), **params):
         'class_': 'fancybox',
         'target': '_blank',
         'data-fancybox-group': 'qscan-image',
+        # the full-size image may be an SVG, which fancybox does not detect
+        'data-fancybox-type': 'image',
     }
     aparams.update(linkparams)
     img = str(img)
@@ -457,8 +469,10 @@ def fancybox_img(img, linkparams=dict(), **params):
     imgparams = {
         'alt': os.path.basename(img),
         'class_': 'img-responsive',
+        'loading': 'lazy',
     }
-    imgparams['src'] = img
+    # show the thumbnail, the full-size image is only fetched on demand
+    imgparams['src'] = thumbnail_path(img)
     imgparams.update(params)
     page.img(id_='img_%s_%s' % (channel, duration), **imgparams)
     page.a.close()
@@ -496,6 +510,50 @@ def scaffold_plots(plots, nperrow=2):
     return page()
 
 
+def scaffold_canvases(channel, nperrow=2):
+    """Embed the interactive viewer of a channel in a bootstrap scaffold
+
+    Parameters
+    ----------
+    channel : `OmegaChannel`
+        the channel whose data are drawn, with one ``<canvas>`` for each
+        of its plot durations
+    nperrow : `int`
+        the number of canvases to place in a row (on a desktop screen)
+
+    Returns
+    -------
+    page : `~glue.markup.page`
+        the markup object containing the scaffolded HTML
+
+    Notes
+    -----
+    The viewer reads the data file written by
+    `~gwdetchar.omega.viewer.write_data`, and requires a browser that
+    supports the ``DecompressionStream`` API.
+    """
+    page = markup.page()
+    x = int(12//nperrow)
+    chanstring = channel.name.replace('-', '_').replace(':', '-')
+    page.div(class_='omega-viewer', **{'data-channel': chanstring})
+    for i, t in enumerate(channel.pranges):
+        if i % nperrow == 0:
+            page.div(class_='row', style="width:96%;")
+        page.div(class_='col-sm-%d' % x)
+        page.add(markup.oneliner.canvas(
+            '', id_='canvas_%s_%s' % (chanstring, t), width=600,
+            height=375, style='width: 100%;'))
+        page.div.close()  # col
+        if i % nperrow == nperrow - 1:
+            page.div.close()  # row
+    if i % nperrow < nperrow-1:
+        page.div.close()  # row
+    page.div.close()  # omega-viewer
+    page.script("loadOmegaData('%s', '%s');"
+                % (chanstring, data_filename(channel.name)))
+    return page()
+
+
 def write_footer(about=None, date=None):
     """Write a <footer> for a Qscan page
 
@@ -643,7 +701,8 @@ def write_toc(blocks):
 
 
 def write_block(block, context, tableclass='table table-condensed table-hover '
-                                           'table-responsive'):
+                                           'table-responsive',
+                interactive=False):
     """Write the HTML summary for a specific block of channels
 
     Parameters
@@ -656,6 +715,9 @@ def write_block(block, context, tableclass='table table-condensed table-hover '
         'warning', or 'danger')
     tableclass : `str`, optional
         the ``class`` for the summary ``<table>``
+    interactive : `bool`, optional
+        whether to draw each channel in the in-browser viewer, rather than
+        show its images, default: `False`
 
     Returns
     -------
@@ -733,14 +795,18 @@ def write_block(block, context, tableclass='table table-condensed table-hover '
                     **{'aria-labelledby': _id})
             for ptype in ptypes:
                 page.li(toggle_link('{0}_{1}'.format(pclass, ptype), channel,
-                                    channel.pranges))
+                                    channel.pranges, interactive=interactive))
             page.ul.close()  # dropdown-menu
             page.div.close()  # btn-group
         page.div.close()  # btn-group
 
         # plots
-        page.add(scaffold_plots(channel.plots['qscan_whitened'],
-                 nperrow=min(len(channel.pranges), 2)))
+        if interactive:
+            page.add(scaffold_canvases(
+                channel, nperrow=min(len(channel.pranges), 2)))
+        else:
+            page.add(scaffold_plots(channel.plots['qscan_whitened'],
+                     nperrow=min(len(channel.pranges), 2)))
 
         page.div.close()  # col-md-9
         page.div.close()  # row
@@ -758,8 +824,57 @@ def write_block(block, context, tableclass='table table-condensed table-hover '
 # but not in the actual function declaration - the decorator will take care of
 # that for you.
 
+def write_prescreen(prescreened, saved=None,
+                    tableclass='table table-condensed table-hover '
+                               'table-responsive'):
+    """Write the HTML summary of channels rejected at pre-screen
+
+    Parameters
+    ----------
+    prescreened : `list` of `tuple`
+        the ``(name, bound, threshold)`` of each rejected channel, where
+        ``bound`` is the upper bound on its loudest tile energy and
+        ``threshold`` the energy required for significance
+    saved : `float`, optional
+        the estimated analysis time saved by the pre-screen, in seconds
+    tableclass : `str`, optional
+        the ``class`` for the summary ``<table>``
+
+    Returns
+    -------
+    page : `~glue.markup.page`
+        the formatted HTML for the pre-screen summary
+    """
+    page = markup.page()
+    page.h2('Pre-screen')
+    page.p('The following channels were rejected before the full search, '
+           'as a coarse tiling showed that they could not pass the false '
+           'alarm rate threshold:')
+    page.table(class_=tableclass)
+    page.thead()
+    page.tr()
+    for h in ['Channel', 'Energy bound', 'Energy threshold']:
+        page.th(h)
+    page.tr.close()
+    page.thead.close()
+    page.tbody()
+    for name, bound, threshold in prescreened:
+        page.tr()
+        page.td(cis_link(name))
+        page.td('%.1f' % bound)
+        page.td('%.1f' % threshold)
+        page.tr.close()
+    page.tbody.close()
+    page.table.close()
+    if saved is not None:
+        page.p('The pre-screen saved an estimated %.1f seconds of '
+               'analysis time.' % saved)
+    return page()
+
+
 @wrap_html
-def write_qscan_page(blocks, context):
+def write_qscan_page(blocks, context, prescreened=None, saved=None,
+                     interactive=False):
     """Write the Qscan results to HTML
 
     Parameters
@@ -773,6 +888,148 @@ def write_qscan_page(blocks, context):
     context : `str`, optional
         the type of Bootstrap ``<panel>`` object to use, color-coded by
         GWO standard
+    prescreened : `list` of `tuple`, optional
+        the channels rejected at pre-screen, see `write_prescreen`
+    saved : `float`, optional
+        the estimated analysis time saved by the pre-screen, in seconds
+    interactive : `bool`, optional
+        whether to draw each channel in the in-browser viewer, see
+        `write_block`, default: `False`
+
+    Returns
+    -------
+    index : `str`
+        the path of the HTML written for this analysis
+    """
+    page = markup.page()
+    page.add(write_toc(blocks))
+    page.h2('Results')
+    page.p('The following blocks of channels were scanned for interesting '
+           'time-frequency morphology:')
+    for block in blocks:
+        page.add(write_block(block, context, interactive=interactive))
+    if prescreened:
+        page.add(write_prescreen(prescreened, saved=saved))
+    return page
+
+
+@wrap_html
+def write_batch_index(scans, snrs=None,
+                      tableclass='table table-condensed table-hover '
+                                 'table-responsive'):
+    """Write the summary index of a batch of Qscans
+
+    Parameters
+    ----------
+    ifo : `str`
+        the prefix of the interferometer used in this analysis
+    gpstime  : `str`
+        a label for the times scanned, e.g. their GPS range
+    scans : `list` of `tuple`
+        the ``(gpstime, path, channels)`` of each scan, where ``path`` is
+        the output directory of the scan relative to this index, and
+        ``channels`` are its significant channels, each with the
+        properties of its loudest tile
+    snrs : `list` of `float`, optional
+        the SNR of the trigger at each time, if the times were read from a
+        trigger file
+    tableclass : `str`, optional
+        the ``class`` for the summary ``<table>``
+    outdir : `str`, optional
+        the output directory for the HTML
+
+    Returns
+    -------
+    index : `str`
+        the path of the HTML written for this batch
+    """
+    page = markup.page()
+    page.h2('Batch summary')
+    page.p('Omega scans were made at each of the following times. For each '
+           'scan, the loudest of its significant channels is listed.')
+    page.table(class_=tableclass)
+    page.thead()
+    page.tr()
+    header = ['GPS Time', 'Significant channels', 'Loudest channel',
+              'Frequency', 'Q Factor', 'Energy', 'SNR']
+    if snrs is not None:
+        header.insert(1, 'Trigger SNR')
+    for h in header:
+        page.th(h)
+    page.tr.close()
+    page.thead.close()
+    page.tbody()
+    for i, (gpstime, path, channels) in enumerate(scans):
+        page.tr()
+        page.td(html_link('%s/' % path, '%s' % gpstime, target=None))
+        if snrs is not None:
+            page.td('%.1f' % snrs[i])
+        page.td('%d' % len(channels))
+        if channels:
+            loudest = max(channels, key=lambda c: c.energy)
+            page.td(cis_link(loudest.name))
+            page.td('%.1f Hz' % loudest.f)
+            page.td('%.1f' % loudest.Q)
+            page.td('%.1f' % loudest.energy)
+            page.td('%.1f' % loudest.snr)
+        else:
+            page.td('-', colspan=5)
+        page.tr.close()
+    page.tbody.close()
+    page.table.close()
+    return page
+
+
+# -- incremental output -------------------------------------------------------
+
+def _write_atomic(content, target):
+    """Write text to a file, so that readers never see it half-written
+    """
+    tmp = '%s.tmp' % target
+    with open(tmp, 'w') as fobj:
+        fobj.write(content)
+    os.rename(tmp, target)
+    return target
+
+
+def fragment_path(key, outdir=os.path.curdir):
+    """Return the path of one fragment of an incremental Qscan page
+
+    Parameters
+    ----------
+    key : `str`
+        the key of the fragment, e.g. `OmegaChannelList.key`
+    outdir : `str`, optional
+        the output directory of the page
+
+    Returns
+    -------
+    path : `str`
+    """
+    return os.path.join(outdir, 'blocks', '%s.html' % key)
+
+
+@wrap_html
+def write_qscan_shell(blocks, context='default'):
+    """Write the fixed shell of an incremental Qscan page
+
+    The shell holds the table of contents and an empty placeholder for
+    each block, into which the browser loads each fragment written by
+    `write_fragment` as `write_status` records it as done. Each
+    placeholder carries the ``block-<key>`` anchor of its block, linked
+    from the table of contents, until it is replaced by the fragment.
+
+    Parameters
+    ----------
+    ifo : `str`
+        the prefix of the interferometer used in this analysis
+    gpstime  : `float`
+        the central GPS time of the analysis
+    blocks : `list` of `OmegaChannelList`
+        the channel blocks to be scanned in the analysis
+    context : `str`, optional
+        the type of Bootstrap ``<panel>`` object to use for the placeholder
+        of each block, color-coded by GWO standard
 
     Returns
     -------
@@ -784,11 +1041,84 @@ def write_qscan_page(blocks, context):
     page.h2('Results')
     page.p('The following blocks of channels were scanned for interesting '
            'time-frequency morphology:')
+    page.div(class_='alert alert-info', id_='qscan-status')
+    page.p('This analysis is in progress, results will appear below as '
+           'each block is completed.')
+    page.div.close()
     for block in blocks:
-        page.add(write_block(block, context))
+        page.div(id_='fragment-%s' % block.key, class_='qscan-fragment',
+                 **{'data-src': fragment_path(block.key)})
+        page.div(class_='panel panel-%s' % context,
+                 id_='block-%s' % block.key)
+        page.div(class_='panel-heading')
+        page.h3(block.name, class_='panel-title')
+        page.div.close()  # panel-heading
+        page.div('Waiting for results...', class_='panel-body')
+        page.div.close()  # panel
+        page.div.close()  # qscan-fragment
+    page.div('', id_='fragment-prescreen', class_='qscan-fragment',
+             **{'data-src': fragment_path('prescreen')})
+    page.script("loadQscanFragments('status.json');")
     return page
 
 
+def write_fragment(key, content, outdir=os.path.curdir):
+    """Write one fragment of an incremental Qscan page
+
+    Parameters
+    ----------
+    key : `str`
+        the key of the fragment, one of the block keys given to
+        `write_qscan_shell`, or ``'prescreen'``
+    content : `str`
+        the HTML content of the fragment, e.g. from `write_block`
+    outdir : `str`, optional
+        the output directory of the page
+
+    Returns
+    -------
+    path : `str`
+        the path of the fragment written
+    """
+    target = fragment_path(key, outdir=outdir)
+    if not os.path.isdir(os.path.dirname(target)):
+        os.makedirs(os.path.dirname(target))
+    return _write_atomic(str(content), target)
+
+
+def write_status(fragments, empty=(), complete=False,
+                 outdir=os.path.curdir):
+    """Write the status marker of an incremental Qscan page
+
+    Parameters
+    ----------
+    fragments : `dict` of `int`
+        the revision of each fragment written so far, keyed by fragment,
+        see `write_fragment`; the page reloads a fragment whenever its
+        revision changes
+    empty : `list` of `str`, optional
+        the keys of blocks with no results, which are removed from the
+        page
+    complete : `bool`, optional
+        whether the analysis has finished, default: `False`
+    outdir : `str`, optional
+        the output directory of the page
+
+    Returns
+    -------
+    path : `str`
+        the path of the status marker written
+    """
+    status = {
+        'fragments': dict(fragments),
+        'empty': list(empty),
+        'complete': complete,
+        'updated': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    return _write_atomic(json.dumps(status),
+                         os.path.join(outdir, 'status.json'))
+
+
 @wrap_html
 def write_null_page(reason, context='info'):
     """Write the Qscan results to HTML
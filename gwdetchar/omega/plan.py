@@ -0,0 +1,481 @@
+# coding=utf-8
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# GW DetChar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GW DetChar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GW DetChar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Planning of data reads for Omega scans
+
+Each block of channels needs only enough data to estimate its ASD, and
+to let the high-pass and whitening filters settle either side of the
+scanned duration, see `data_window`. Blocks that share a frametype are
+then read together, over the union of their windows, see `plan_reads`,
+so that each frame file is opened once. A `Prefetcher` reads ahead in a
+background thread, so that the disks are busy while earlier data are
+analysed.
+
+When several times are scanned in one batch, see `read_times`, times
+whose windows overlap are clustered, see `cluster_windows`, and the data
+of each cluster are read once, as a `ReadGroup`, to be shared by the
+scans of all its times.
+"""
+
+from __future__ import division
+
+import os
+import sys
+import warnings
+import threading
+
+import six
+
+import numpy
+
+from gwpy.table import EventTable
+
+__author__ = 'Alex Urban <alexander.urban@ligo.org>'
+__credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+__all__ = ['filter_padding', 'data_window', 'DataRead', 'plan_reads',
+           'read_times', 'cluster_windows', 'ReadGroup', 'Prefetcher']
+
+# number of FFT averages used to estimate the ASD of each channel
+ASD_AVERAGES = 64
+
+# number of cycles of the high-pass corner frequency over which the
+# zero-phase filter response settles, to 1e-5 of its peak for the
+# filters used by gwdetchar-omega
+SETTLE_CYCLES = 32
+
+# maximum padding either side of the central time, as originally read
+MAX_PADDING = 256
+
+
+def filter_padding(fftlength, highpass=None):
+    """Return the padding either side of the scanned data needed to filter it
+
+    The data are high-passed over the whitening window, and then whitened,
+    so the high-pass filter must settle before the whitening window
+    begins, and after it ends.
+
+    Parameters
+    ----------
+    fftlength : `float`
+        the FFT length of the ASD, the length of the whitening filter
+    highpass : `float`, optional
+        the high-pass corner frequency, default is to assume no high-pass
+        filter
+
+    Returns
+    -------
+    wpad : `float`
+        the padding needed for the whitening filter to settle
+    hpad : `float`
+        the padding needed for the whitening and high-pass filters to
+        settle, `SETTLE_CYCLES` cycles of ``highpass`` beyond ``wpad``
+    """
+    hpad = fftlength
+    if highpass:
+        hpad += SETTLE_CYCLES / highpass
+    return fftlength, hpad
+
+
+def data_window(gps, duration, fftlength, highpass=None,
+                naverages=ASD_AVERAGES, maxpad=MAX_PADDING):
+    """Return the minimal window of data needed to scan one block
+
+    Parameters
+    ----------
+    gps : `float`
+        the central GPS time of the scan
+    duration : `float`
+        the duration of data to scan
+    fftlength : `float`
+        the FFT length of the ASD, which is estimated with 50% overlap
+    highpass : `float`, optional
+        the lowest high-pass corner frequency of any channel, default is
+        to assume no high-pass filter
+    naverages : `int`, optional
+        the number of FFT averages with which to estimate the ASD
+    maxpad : `float`, optional
+        the maximum padding either side of ``gps``
+
+    Returns
+    -------
+    start, end : `float`
+        the GPS ``[start, end)`` of the window, this is padded by a further
+        quarter of ``fftlength`` either side
+
+    Warns
+    -----
+    UserWarning
+        if ``maxpad`` is too short for the filters to settle
+
+    Notes
+    -----
+    The window covers ``duration``, plus the settling time of the filters
+    either side, one ``fftlength`` for the whitening filter, and a further
+    `SETTLE_CYCLES` cycles of the high-pass corner before that, see
+    `filter_padding`. It is extended, if necessary, to hold ``naverages``
+    overlapping FFTs, but never beyond ``maxpad`` seconds either side of
+    ``gps``.
+    """
+    _, hpad = filter_padding(fftlength, highpass=highpass)
+    if duration / 2. + hpad > maxpad:
+        warnings.warn("A window of %s seconds either side of %s is too "
+                      "short for a %s Hz high-pass filter to settle, filter "
+                      "transients may remain in the scanned data"
+                      % (maxpad, gps, highpass))
+    pad = max(duration / 2. + hpad, (naverages + 1) * fftlength / 4.)
+    pad = min(pad, maxpad) + fftlength / 4.
+    return gps - pad, gps + pad
+
+
+class DataRead(object):
+    """A single read of data for several requests sharing a frametype
+
+    Parameters
+    ----------
+    frametype : `str`
+        the frametype to read
+
+    Attributes
+    ----------
+    channels : `list` of `str`
+        the unique names of all channels to read, in order of request
+    start, end : `float`
+        the GPS ``[start, end)`` of the union of the requested windows
+    tags : `list`
+        the tag of each request served by this read, in order
+    """
+    def __init__(self, frametype):
+        self.frametype = frametype
+        self.channels = []
+        self.start = None
+        self.end = None
+        self.tags = []
+
+    def __repr__(self):
+        return '<DataRead(%s, [%s, %s), %d channels)>' % (
+            self.frametype, self.start, self.end, len(self.channels))
+
+    @property
+    def span(self):
+        """The duration of this read, in seconds
+        """
+        return self.end - self.start
+
+    @property
+    def extent(self):
+        """The number of channel-seconds of data in this read
+        """
+        return len(self.channels) * self.span
+
+    def overlaps(self, start, end, maxgap=0):
+        """Return whether a window overlaps this read, to within ``maxgap``
+        """
+        return self.start - maxgap <= end and start <= self.end + maxgap
+
+    def add(self, channels, start, end, tag=None):
+        """Add a request to this read, extending its window as needed
+        """
+        for name in channels:
+            if name not in self.channels:
+                self.channels.append(name)
+        self.start = start if self.start is None else min(self.start, start)
+        self.end = end if self.end is None else max(self.end, end)
+        self.tags.append(tag)
+
+
+def plan_reads(requests, maxgap=0):
+    """Merge requests for data into as few reads as possible
+
+    Requests for the same frametype are merged into one read whenever
+    their windows overlap, or are separated by no more than ``maxgap``.
+
+    Parameters
+    ----------
+    requests : `iterable` of `tuple`
+        the ``(frametype, channels, (start, end), tag)`` of each request,
+        the ``tag`` is any object identifying the request
+    maxgap : `float`, optional
+        the longest gap in seconds to read through between two windows
+
+    Returns
+    -------
+    reads : `list` of `DataRead`
+        the reads, in order of the first request each serves
+    """
+    reads = []
+    for frametype, channels, (start, end), tag in requests:
+        for read in reads:
+            if (read.frametype == frametype and
+                    read.overlaps(start, end, maxgap=maxgap)):
+                break
+        else:
+            read = DataRead(frametype)
+            reads.append(read)
+        read.add(channels, start, end, tag=tag)
+    return reads
+
+
+def read_times(source, nmax=None):
+    """Parse the GPS times of a batch of scans
+
+    Parameters
+    ----------
+    source : `list` of `str`
+        the GPS times, or the path of a single file holding either a column
+        of GPS times, or Omicron triggers in LIGO_LW XML, HDF5, or ROOT
+        format
+    nmax : `int`, optional
+        the number of loudest triggers to keep, by SNR, default: all
+
+    Returns
+    -------
+    times : `list` of `float`
+        the unique GPS times, in order
+    snrs : `list` of `float`, or `None`
+        the SNR of the trigger at each time, or `None` if the times were
+        not read from a trigger file
+    """
+    if len(source) > 1 or not os.path.isfile(source[0]):
+        return sorted(set(float(t) for t in source)), None
+    path = source[0]
+    if not path.endswith(('.xml', '.xml.gz', '.h5', '.hdf5', '.hdf',
+                          '.root')):
+        times = numpy.loadtxt(path, dtype=float, usecols=(0,), ndmin=1)
+        return sorted(set(times.tolist())), None
+    if path.endswith(('.xml', '.xml.gz')):
+        table = EventTable.read(path, format='ligolw', tablename='sngl_burst')
+        times = table['peak_time'] + table['peak_time_ns'] * 1e-9
+    elif path.endswith('.root'):
+        table = EventTable.read(path, treename='triggers')
+        times = table['time']
+    else:
+        table = EventTable.read(path, path='triggers')
+        times = table['time']
+    times = numpy.asarray(times, dtype=float)
+    snrs = numpy.asarray(table['snr'], dtype=float)
+    # keep the loudest trigger at each time, then sort by time
+    loudest = numpy.argsort(snrs)[::-1][:nmax]
+    times, index = numpy.unique(times[loudest], return_index=True)
+    return times.tolist(), snrs[loudest][index].tolist()
+
+
+def cluster_windows(windows, maxgap=0, maxspan=None):
+    """Cluster windows of data that should be read together
+
+    Windows are taken in order of their start, and each is added to the
+    current cluster if it overlaps the union of that cluster's windows, or
+    is separated from it by no more than ``maxgap``, unless the cluster
+    would then span more than ``maxspan`` seconds.
+
+    Parameters
+    ----------
+    windows : `list` of `tuple`
+        the GPS ``(start, end)`` of each window, e.g. the window of data
+        needed to scan each of several times
+    maxgap : `float`, optional
+        the longest gap in seconds to read through between two windows
+    maxspan : `float`, optional
+        the maximum span in seconds of a cluster, default is no limit,
+        a window longer than this is always a cluster of its own
+
+    Returns
+    -------
+    clusters : `list` of `list`
+        the indices of the windows in each cluster, in order of time
+    """
+    clusters, spans = [], []
+    for index in sorted(range(len(windows)), key=lambda i: windows[i]):
+        start, end = windows[index]
+        if clusters:
+            cstart, cend = spans[-1]
+            if start <= cend + maxgap and (
+                    maxspan is None or max(cend, end) - cstart <= maxspan):
+                clusters[-1].append(index)
+                spans[-1] = (cstart, max(cend, end))
+                continue
+        clusters.append([index])
+        spans.append((start, end))
+    return clusters
+
+
+class ReadGroup(object):
+    """Several reads whose data are needed together
+
+    A `ReadGroup` may be given to a `Prefetcher` in place of a `DataRead`,
+    so that, e.g., all of the frametypes needed by a cluster of scans are
+    read ahead as one.
+
+    Parameters
+    ----------
+    reads : `list` of `DataRead`
+        the reads in this group
+    tag : `object`, optional
+        any object identifying this group
+    """
+    def __init__(self, reads, tag=None):
+        self.reads = list(reads)
+        self.tag = tag
+
+    def __repr__(self):
+        return '<ReadGroup(%d reads, %d channels)>' % (
+            len(self.reads), len(self.channels))
+
+    @property
+    def channels(self):
+        """The names of all channels to read, in order of the reads
+        """
+        return [name for read in self.reads for name in read.channels]
+
+    @property
+    def extent(self):
+        """The number of channel-seconds of data in all reads
+        """
+        return sum(read.extent for read in self.reads)
+
+
+# -- prefetching --------------------------------------------------------------
+
+def nbytes(data):
+    """Return the total size in bytes of a `dict` of arrays
+    """
+    return sum(value.nbytes for value in data.values())
+
+
+class Prefetcher(object):
+    """Iterate over the data of several reads, reading ahead in a thread
+
+    Parameters
+    ----------
+    reads : `list` of `DataRead` or `ReadGroup`
+        the reads, in order
+    reader : `callable`
+        the function to read the data of one `DataRead`, returning a
+        `dict` of arrays, this is not called for reads with no channels,
+        whose data are `None`
+    depth : `int`, optional
+        the maximum number of reads to hold ahead of the one in use,
+        default is to read each only when it is needed
+    maxbytes : `int`, optional
+        the maximum size of data to hold in memory, including the read in
+        use, above which no further reads are started ahead, default is
+        no limit
+
+    Notes
+    -----
+    The size of each read is estimated from the bytes per channel per
+    second of all reads so far, so nothing is read ahead until the first
+    read is complete. The read in use is counted until the next is asked
+    for, even if its data are released sooner.
+    """
+    def __init__(self, reads, reader, depth=0, maxbytes=None):
+        self.reads = list(reads)
+        self.reader = reader
+        self.depth = int(depth)
+        self.maxbytes = maxbytes
+        self._cond = threading.Condition()
+        self._results = {}
+        self._sizes = {}
+        self._current = 0
+        self._stopped = False
+        self._rate = None
+        self._totals = [0, 0]
+
+    def __len__(self):
+        return len(self.reads)
+
+    def _read(self, read):
+        """Read one `DataRead`, returning its data and their size
+        """
+        if not read.channels:
+            return None, 0
+        data = self.reader(read)
+        return data, nbytes(data)
+
+    def estimate(self, read):
+        """Estimate the size of a read, or `None` if nothing is yet read
+        """
+        if self._rate is None:
+            return None
+        return self._rate * read.extent
+
+    def _ready(self, index):
+        """Return whether the read at ``index`` may be started
+        """
+        if index == self._current:  # needed now
+            return True
+        if index - self._current > self.depth:
+            return False
+        if self.maxbytes is None:
+            return True
+        size = self.estimate(self.reads[index])
+        return size is not None and (
+            sum(self._sizes.values()) + size <= self.maxbytes)
+
+    def _run(self):
+        """Read each `DataRead` in turn, as allowed by `_ready`
+        """
+        for index, read in enumerate(self.reads):
+            with self._cond:
+                while not (self._stopped or self._ready(index)):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            try:
+                data, size = self._read(read)
+            except Exception:
+                with self._cond:
+                    self._results[index] = sys.exc_info()
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._results[index] = data
+                self._sizes[index] = size
+                if read.channels:
+                    self._totals[0] += size
+                    self._totals[1] += read.extent
+                    self._rate = self._totals[0] / self._totals[1]
+                self._cond.notify_all()
+
+    def __iter__(self):
+        """Yield the ``(read, data)`` of each read, in order
+        """
+        if self.depth < 1:  # read each as needed, in this thread
+            for read in self.reads:
+                yield read, self._read(read)[0]
+            return
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+        try:
+            for index, read in enumerate(self.reads):
+                with self._cond:
+                    self._current = index
+                    self._sizes.pop(index - 1, None)
+                    self._cond.notify_all()
+                    while index not in self._results:
+                        self._cond.wait()
+                    data = self._results.pop(index)
+                if isinstance(data, tuple):  # the read raised an exception
+                    six.reraise(*data)
+                yield read, data
+                del data
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
@@ -21,11 +21,17 @@
 
 from __future__ import division
 
+import numpy
+
 from matplotlib import cm
 from matplotlib import rcParams
+from matplotlib.transforms import blended_transform_factory
 
+from gwpy.plotter import figure
 from gwpy.plotter.colors import GW_OBSERVATORY_COLORS
 
+from ..io.html import save_figure
+
 __author__ = 'Alex Urban <alexander.urban@ligo.org>'
 __credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
 
@@ -43,19 +49,245 @@ rcParams.update({
 
 # -- Utilities ----------------------------------------------------------------
 
+def _pixel_range(low, high, edges):
+    """Return the ``[first, last)`` pixels overlapping each ``[low, high)``
+    """
+    n = edges.size - 1
+    first = numpy.clip(numpy.searchsorted(edges, low, side='right') - 1, 0, n)
+    last = numpy.clip(numpy.searchsorted(edges, high, side='left'), 0, n)
+    return first, numpy.maximum(last, first + 1)
+
+
+def rasterize_tiles(x, y, width, height, values, xlim, ylim, shape,
+                    logy=False, anchor='center'):
+    """Paint rectangular tiles into an image array
+
+    Each pixel takes the largest value of all tiles overlapping it, and
+    every visible tile covers at least one pixel.
+
+    Parameters
+    ----------
+    x, y : `numpy.ndarray`
+        the position of each tile, see ``anchor``
+    width, height : `numpy.ndarray`
+        the size of each tile
+    values : `numpy.ndarray`
+        the value of each tile
+    xlim, ylim : `tuple` of `float`
+        the ``(low, high)`` limits of the image on each axis
+    shape : `tuple` of `int`
+        the ``(rows, columns)`` shape of the image
+    logy : `bool`, optional
+        if `True`, pixel rows are equally spaced in log-``y``, otherwise
+        they are equally spaced in ``y``
+    anchor : `str`, optional
+        the position of each tile given by ``(x, y)``, one of `'center'`
+        or `'ll'` (lower left)
+
+    Returns
+    -------
+    image : `numpy.ndarray`
+        an array of the given shape, with rows of increasing ``y``, that
+        is `numpy.nan` where there are no tiles
+
+    Raises
+    ------
+    ValueError
+        if ``anchor`` is not recognised
+    """
+    x, y, width, height, values = [numpy.asarray(a, dtype=float) for
+                                   a in (x, y, width, height, values)]
+    if anchor == 'center':
+        x0, y0 = x - width / 2., y - height / 2.
+    elif anchor == 'll':
+        x0, y0 = x, y
+    else:
+        raise ValueError("Unrecognised tile anchor %r" % anchor)
+    x1, y1 = x0 + width, y0 + height
+    nrow, ncol = shape
+    xedges = numpy.linspace(xlim[0], xlim[1], ncol + 1)
+    if logy:
+        yedges = numpy.logspace(numpy.log10(ylim[0]), numpy.log10(ylim[1]),
+                                nrow + 1)
+    else:
+        yedges = numpy.linspace(ylim[0], ylim[1], nrow + 1)
+
+    # pixel ranges of the visible tiles
+    visible = ((x1 > xlim[0]) & (x0 < xlim[1]) &
+               (y1 > ylim[0]) & (y0 < ylim[1]) & numpy.isfinite(values))
+    xfirst, xlast = _pixel_range(x0[visible], x1[visible], xedges)
+    yfirst, ylast = _pixel_range(y0[visible], y1[visible], yedges)
+    values = values[visible]
+
+    # paint tiles one set of pixel rows at a time
+    image = numpy.full(shape, -numpy.inf)
+    keys = yfirst * (nrow + 1) + ylast
+    order = numpy.argsort(keys, kind='mergesort')
+    bounds = numpy.flatnonzero(numpy.diff(keys[order])) + 1
+    for idx in numpy.split(order, bounds):
+        if not idx.size:
+            continue
+        lengths = xlast[idx] - xfirst[idx]
+        offsets = numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        cols = (numpy.repeat(xfirst[idx], lengths) +
+                numpy.arange(lengths.sum()) - offsets)
+        line = numpy.full(ncol, -numpy.inf)
+        numpy.maximum.at(line, cols, numpy.repeat(values[idx], lengths))
+        rows = image[yfirst[idx[0]]:ylast[idx[0]]]
+        numpy.maximum(rows, line, out=rows)
+    image[numpy.isneginf(image)] = numpy.nan
+    return image
+
+
+def plot_tiles(ax, x, y, width, height, values, xlim, ylim, anchor='center',
+               image=None, **kwargs):
+    """Draw rectangular tiles on an axes as a single rasterised image
+
+    This is much faster to draw and save than one patch per tile. The
+    image is painted at the resolution of the axes, and is placed in axes
+    coordinates along ``y``, so it matches a linear or log ``y`` scale
+    exactly as long as ``ylim`` is not changed.
+
+    Parameters
+    ----------
+    ax : `~matplotlib.axes.Axes`
+        the axes on which to draw, with its ``y`` scale already set
+    x, y, width, height, values : `numpy.ndarray`
+        the tiles to draw, see `rasterize_tiles`
+    xlim, ylim : `tuple` of `float`
+        the ``(low, high)`` axis limits to set
+    anchor : `str`, optional
+        the position of each tile given by ``(x, y)``, see
+        `rasterize_tiles`
+    image : `~matplotlib.image.AxesImage`, optional
+        an image drawn by a previous call, to repaint for new limits
+        instead of drawing a new one
+    **kwargs
+        other keyword arguments are passed to
+        `~matplotlib.axes.Axes.imshow`
+
+    Returns
+    -------
+    image : `~matplotlib.image.AxesImage`
+        the rasterised tiles
+    """
+    bbox = ax.get_window_extent()
+    shape = (max(int(numpy.ceil(bbox.height)), 1),
+             max(int(numpy.ceil(bbox.width)), 1))
+    data = rasterize_tiles(x, y, width, height, values, xlim, ylim, shape,
+                           logy=ax.get_yscale() == 'log', anchor=anchor)
+    extent = (xlim[0], xlim[1], 0, 1)
+    if image is None:
+        kwargs.setdefault('interpolation', 'nearest')
+        image = ax.imshow(
+            data, extent=extent, origin='lower', aspect='auto',
+            transform=blended_transform_factory(ax.transData, ax.transAxes),
+            **kwargs)
+    else:
+        image.set_data(data)
+        image.set_extent(extent)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    return image
+
+
+def plot_qscan(ax, specgram, xlim, ylim=None, image=None, **kwargs):
+    """Draw a Q-transform spectrogram on an axes as a single image
+
+    The frequency bins are resampled onto the pixel rows of the axes, and,
+    as for `plot_tiles`, the image is placed in axes coordinates along
+    ``y``, so it matches a linear or log ``y`` scale exactly as long as
+    ``ylim`` is not changed.
+
+    Parameters
+    ----------
+    ax : `~matplotlib.axes.Axes`
+        the axes on which to draw, with its ``y`` scale already set
+    specgram : `~gwpy.spectrogram.Spectrogram`
+        the Q-transform to draw
+    xlim : `tuple` of `float`
+        the ``(low, high)`` time limits to set
+    ylim : `tuple` of `float`, optional
+        the ``(low, high)`` frequency limits to set, default: the range of
+        frequencies of ``specgram``
+    image : `~matplotlib.image.AxesImage`, optional
+        an image drawn by a previous call, to repaint with new data
+        instead of drawing a new one
+    **kwargs
+        other keyword arguments are passed to
+        `~matplotlib.axes.Axes.imshow`
+
+    Returns
+    -------
+    image : `~matplotlib.image.AxesImage`
+        the Q-transform image
+    """
+    freqs = numpy.asarray(specgram.frequencies.value, dtype=float)
+    if ylim is None:
+        ylim = (freqs[0], freqs[-1])
+    nrow = max(int(numpy.ceil(ax.get_window_extent().height)), 1)
+    if ax.get_yscale() == 'log':
+        edges = numpy.logspace(numpy.log10(ylim[0]), numpy.log10(ylim[1]),
+                               nrow + 1)
+    else:
+        edges = numpy.linspace(ylim[0], ylim[1], nrow + 1)
+    # the nearest frequency bin to the centre of each pixel row
+    centres = (edges[:-1] + edges[1:]) / 2.
+    index = numpy.rint(numpy.interp(centres, freqs,
+                                    numpy.arange(freqs.size))).astype(int)
+    data = numpy.asarray(specgram.value).T[index]
+    t0 = specgram.x0.value
+    extent = (t0, t0 + specgram.shape[0] * specgram.dx.value, 0, 1)
+    if image is None:
+        kwargs.setdefault('interpolation', 'nearest')
+        image = ax.imshow(
+            data, extent=extent, origin='lower', aspect='auto',
+            transform=blended_transform_factory(ax.transData, ax.transAxes),
+            **kwargs)
+    else:
+        image.set_data(data)
+        image.set_extent(extent)
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    return image
+
+
+def _eventgram_tiles(table):
+    """Return the ``(x, y, width, height, values)`` tiles of an eventgram
+    """
+    return (table['central_time'], table['central_freq'], table['duration'],
+            table['bandwidth'], table['energy'])
+
+
 def omega_plot(series, gps, span, channel, colormap='viridis', clim=None,
                qscan=False, eventgram=False, ylabel=None, figsize=[12, 6]):
     """Plot any GWPy Series object with a time axis
     """
     # construct plot
     if qscan:
-        # plot Q-transform
-        plot = series.crop(gps-span/2, gps+span/2).plot(figsize=figsize)
+        # plot Q-transform as a single image
+        plot = figure(figsize=figsize)
+        ax = plot.add_subplot(111, projection='timeseries')
+        ax.set_yscale('log')
+        specgram = series.crop(gps-span/2, gps+span/2)
+        vlim = clim or (numpy.nanmin(specgram.value),
+                        numpy.nanmax(specgram.value))
+        plot_qscan(ax, specgram, (gps-span/2, gps+span/2), cmap=colormap,
+                   vmin=vlim[0], vmax=vlim[1])
     elif eventgram:
-        # plot eventgram
-        plot = series.plot('central_time', 'central_freq', 'duration',
-                           'bandwidth', color='energy',
-                           figsize=figsize)
+        # plot eventgram as a single image
+        plot = figure(figsize=figsize)
+        ax = plot.add_subplot(111, projection='triggers')
+        ax.set_yscale('log')
+        x, y, width, height, values = _eventgram_tiles(series)
+        if len(values):
+            ylim = (numpy.min(y - height / 2.), numpy.max(y + height / 2.))
+            vlim = clim or (numpy.min(values), numpy.max(values))
+        else:  # nothing to draw
+            ylim, vlim = ax.get_ylim(), clim or (0, 1)
+        plot_tiles(ax, x, y, width, height, values,
+                   (gps-span/2, gps+span/2), ylim, cmap=colormap,
+                   vmin=vlim[0], vmax=vlim[1])
     else:
         # set color by IFO
         ifo = channel[:2]
@@ -93,3 +325,91 @@ def omega_plot(series, gps, span, channel, colormap='viridis', clim=None,
     ax.grid(True, axis='y', which='both')
     plot.tight_layout()
     return plot
+
+
+def _set_span(plot, series, gps, span, clim=None, qscan=False,
+              eventgram=False):
+    """Set the time span of an existing omega scan plot
+
+    This reproduces the axis and colour limits that `omega_plot` would
+    choose for the given span, without re-drawing any artists.
+    """
+    ax = plot.gca()
+    ax.set_xlim(gps-span/2, gps+span/2)
+    ax.set_xscale('auto-gps')
+    if span <= 1.:
+        ax.set_xlabel('Time [milliseconds]')
+    else:
+        ax.set_xlabel('Time [seconds]')
+    if eventgram:
+        # repaint the tiles at the resolution of the new span
+        x, y, width, height, values = _eventgram_tiles(series)
+        plot_tiles(ax, x, y, width, height, values,
+                   (gps-span/2, gps+span/2), ax.get_ylim(),
+                   image=ax.images[0])
+    elif qscan:
+        # repaint the image with the data of the new span, and autoscale
+        # colours to the visible data
+        specgram = series.crop(gps-span/2, gps+span/2)
+        plot_qscan(ax, specgram, (gps-span/2, gps+span/2), ax.get_ylim(),
+                   image=ax.images[0])
+        if clim is None:
+            ax.images[0].set_clim(numpy.nanmin(specgram.value),
+                                  numpy.nanmax(specgram.value))
+    elif not (qscan or eventgram):
+        # autoscale the amplitude axis to the visible data
+        values = series.crop(gps-span/2, gps+span/2).value
+        ymin, ymax = numpy.nanmin(values), numpy.nanmax(values)
+        margin = (ymax - ymin) * rcParams['axes.ymargin']
+        if margin:
+            ax.set_ylim(ymin - margin, ymax + margin)
+
+
+def omega_plots(series, gps, spans, channel, outputs, colormap='viridis',
+                clim=None, qscan=False, eventgram=False, ylabel=None,
+                figsize=[12, 6], dpi=None):
+    """Draw one omega scan plot, and save it for each of several time spans
+
+    The figure is drawn once, over the longest span, then re-saved for
+    each span by changing only the axis limits (and, where these are
+    autoscaled, the colour or amplitude limits), and the data of images,
+    so artists, including the colorbar, are created only once per view.
+
+    Parameters
+    ----------
+    series : `~gwpy.types.Series`, `~gwpy.table.EventTable`, `list`
+        the data to plot, see `omega_plot`, or a `list` of Q-transform
+        spectrograms, one for each span, each of which is drawn into the
+        same image at the resolution of its span
+    gps : `float`
+        the central GPS time of the plot
+    spans : `list` of `float`
+        the duration of each output plot
+    channel : `str`
+        the name of the channel
+    outputs : `list` of `str`
+        the output file path for each span, each is saved with a thumbnail
+        by `~gwdetchar.io.html.save_figure`
+    dpi : `float`, optional
+        the resolution of each full-size image
+
+    Notes
+    -----
+    All other arguments are as for `omega_plot`.
+    """
+    if isinstance(series, (list, tuple)):
+        longest = int(numpy.argmax(spans))
+        plot = omega_plot(series[longest], gps, spans[longest], channel,
+                          colormap=colormap, clim=clim, qscan=qscan,
+                          ylabel=ylabel, figsize=figsize)
+    else:
+        plot = omega_plot(series, gps, max(spans), channel,
+                          colormap=colormap, clim=clim, qscan=qscan,
+                          eventgram=eventgram, ylabel=ylabel,
+                          figsize=figsize)
+        series = [series] * len(spans)
+    for data, span, output in zip(series, spans, outputs):
+        _set_span(plot, data, gps, span, clim=clim, qscan=qscan,
+                  eventgram=eventgram)
+        save_figure(plot, output, dpi=dpi)
+    plot.close()
@@ -0,0 +1,254 @@
+# coding=utf-8
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# GW DetChar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GW DetChar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GW DetChar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Batched filtering, spectral estimation, and whitening for Omega scans
+
+Channels of a block that share a sample rate are stacked into a 2-D
+array, with one row per channel, so that the segmenting, windowing, and
+Fourier transforms of their ASDs, the whitening of their data, and their
+high-pass filtering, are each done once for all channels, rather than
+once per channel. High-pass filters are designed once for each set of
+parameters, and held in `FILTER_CACHE`.
+"""
+
+from __future__ import division
+
+from six import string_types
+
+import numpy
+from numpy import fft as npfft
+
+from scipy.signal import (get_window, iirdesign, sosfilt)
+try:
+    from scipy.fftpack import next_fast_len
+except ImportError:  # scipy < 0.18
+    from .core import next_power_of_two
+
+    def next_fast_len(target):
+        return int(next_power_of_two(target))
+try:
+    from scipy.signal import sosfiltfilt
+except ImportError:  # scipy < 0.18
+    def sosfiltfilt(sos, x, axis=-1):
+        out = sosfilt(sos, x, axis=-1)[..., ::-1]
+        return sosfilt(sos, out, axis=-1)[..., ::-1]
+
+__author__ = 'Alex Urban <alexander.urban@ligo.org>'
+__credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+__all__ = ['median_bias', 'median_mean_asd', 'whiten', 'FILTER_CACHE',
+           'highpass_sos', 'highpass']
+
+# the SOS of each high-pass filter designed so far, keyed by parameters
+FILTER_CACHE = {}
+
+
+def median_bias(n):
+    """Return the bias of the median of ``n`` periodogram estimates
+
+    The median of ``n`` exponentially distributed values underestimates
+    their mean by this factor, as for ``XLALMedianBias``.
+    """
+    ans = 1.
+    for i in range(1, (n - 1) // 2 + 1):
+        ans += 1. / (2 * i + 1) - 1. / (2 * i)
+    return ans
+
+
+def median_mean_asd(data, nfft, noverlap=None, window='hann', dt=1.):
+    """Estimate the ASD of each row of a 2-D array by the median-mean method
+
+    The data are divided into overlapping segments, each is windowed and
+    Fourier transformed, then the bias-corrected medians of the even and
+    odd segments are averaged, as for the ``'lal_median_mean'`` method of
+    `~gwpy.timeseries.TimeSeries.asd`.
+
+    Parameters
+    ----------
+    data : `numpy.ndarray`
+        the data, one row per channel
+    nfft : `int`
+        the number of samples per segment
+    noverlap : `int`, optional
+        the number of samples by which segments overlap, default is half
+        of ``nfft``
+    window : `str`, `numpy.ndarray`, optional
+        the window to apply to each segment, as for
+        `scipy.signal.get_window`
+    dt : `float`, optional
+        the sample spacing, in seconds
+
+    Returns
+    -------
+    asd : `numpy.ndarray`
+        the one-sided ASD of each row, with ``nfft // 2 + 1`` frequency
+        bins spaced by ``1 / (nfft * dt)``
+
+    Raises
+    ------
+    ValueError
+        if the data hold fewer than two segments
+    """
+    data = numpy.atleast_2d(data)
+    if noverlap is None:
+        noverlap = nfft // 2
+    step = nfft - noverlap
+    nseg = 1 + (data.shape[-1] - nfft) // step
+    if nseg < 2:
+        raise ValueError('Median-mean average requires at least two '
+                         'segments, found %d' % max(nseg, 0))
+    if isinstance(window, string_types):
+        window = get_window(window, nfft)
+    # all segments of all rows at once, as (row, segment, sample)
+    idx = numpy.arange(nfft) + step * numpy.arange(nseg)[:, numpy.newaxis]
+    power = numpy.abs(npfft.rfft(data[:, idx] * window, axis=-1)) ** 2
+    # normalise as a one-sided density
+    power *= 2 * dt / (window ** 2).sum()
+    power[..., 0] /= 2
+    if not nfft % 2:
+        power[..., -1] /= 2
+    even = numpy.median(power[:, ::2], axis=1) / median_bias((nseg + 1) // 2)
+    odd = numpy.median(power[:, 1::2], axis=1) / median_bias(nseg // 2)
+    return numpy.sqrt((even + odd) / 2.)
+
+
+def whiten(data, asd, df, dt=1., taper=None):
+    """Whiten each row of a 2-D array in the frequency domain
+
+    Each row is divided by its ASD, interpolated linearly onto the
+    frequencies of its Fourier transform, and normalised so that white
+    noise of any amplitude is whitened to unit variance.
+
+    Parameters
+    ----------
+    data : `numpy.ndarray`
+        the data, one row per channel
+    asd : `numpy.ndarray`
+        the one-sided ASD of each row, starting at zero frequency
+    df : `float`
+        the frequency spacing of ``asd``, in Hertz
+    dt : `float`, optional
+        the sample spacing of ``data``, in seconds
+    taper : `int`, optional
+        the number of samples at either end of each row to taper with a
+        Hann window, default is half the length of the ASD segments,
+        ``1 / (2 * df * dt)``
+
+    Returns
+    -------
+    whitened : `numpy.ndarray`
+        the whitened data, with the same shape as ``data``
+
+    Notes
+    -----
+    Each row is zero-padded by one ASD segment length before it is
+    transformed, so that the whitening filter does not wrap around, but
+    samples within about one segment length of either end are still
+    corrupted by the taper and the filter response. Frequencies at which
+    the ASD is zero are removed.
+    """
+    data = numpy.atleast_2d(data)
+    asd = numpy.atleast_2d(asd)
+    nrows, nsamp = data.shape
+    nseg = int(round(1 / (df * dt)))
+    if taper is None:
+        taper = nseg // 2
+    taper = min(int(taper), nsamp // 2)
+    # remove the mean, and taper the ends
+    tapered = data - data.mean(axis=-1, keepdims=True)
+    if taper:
+        ramp = numpy.hanning(2 * taper)
+        tapered[:, :taper] *= ramp[:taper]
+        tapered[:, -taper:] *= ramp[taper:]
+    nfft = next_fast_len(nsamp + nseg)
+    fdata = npfft.rfft(tapered, n=nfft, axis=-1)
+    # interpolate each ASD onto the frequencies of the transform, all rows
+    # share the same interpolation weights
+    position = numpy.clip(npfft.rfftfreq(nfft, d=dt) / df, 0,
+                          asd.shape[-1] - 1)
+    low = numpy.minimum(position.astype(int), asd.shape[-1] - 2)
+    weight = position - low
+    interp = asd[:, low] * (1 - weight) + asd[:, low + 1] * weight
+    scale = numpy.zeros_like(interp)
+    numpy.divide(numpy.sqrt(2 * dt), interp, out=scale, where=interp > 0)
+    fdata *= scale
+    return npfft.irfft(fdata, n=nfft, axis=-1)[:, :nsamp]
+
+
+def highpass_sos(frequency, sampling, gpass=2, gstop=30, fstop=None):
+    """Return the second-order sections of a high-pass filter
+
+    The filter is a Chebyshev type-I design, as for
+    `gwpy.signal.filter_design.highpass`, and is designed only once for
+    each set of parameters, then held in `FILTER_CACHE`.
+
+    Parameters
+    ----------
+    frequency : `float`
+        the pass-band corner frequency, in Hertz
+    sampling : `float`
+        the sample rate of the data, in Hertz
+    gpass : `float`, optional
+        the maximum loss in the pass band, in dB
+    gstop : `float`, optional
+        the minimum attenuation in the stop band, in dB
+    fstop : `float`, optional
+        the stop-band edge frequency, default is two thirds of
+        ``frequency``
+
+    Returns
+    -------
+    sos : `numpy.ndarray`
+        the second-order sections of the digital filter
+    """
+    if fstop is None:
+        fstop = frequency * 2 / 3.
+    key = (float(sampling), float(frequency), float(gpass), float(gstop),
+           float(fstop))
+    try:
+        return FILTER_CACHE[key]
+    except KeyError:
+        nyquist = sampling / 2.
+        sos = iirdesign(frequency / nyquist, fstop / nyquist, gpass, gstop,
+                        ftype='cheby1', output='sos')
+        return FILTER_CACHE.setdefault(key, sos)
+
+
+def highpass(data, frequency, sampling, gpass=2, gstop=30, fstop=None):
+    """High-pass filter each row of a 2-D array, with zero phase
+
+    Parameters
+    ----------
+    data : `numpy.ndarray`
+        the data, one row per channel
+
+    Returns
+    -------
+    filtered : `numpy.ndarray`
+        the filtered data, with the same shape as ``data``
+
+    Notes
+    -----
+    All other arguments are as for `highpass_sos`. The filter is applied
+    forwards and backwards, so the first and last few cycles of
+    ``frequency`` are corrupted by its response to the edges, and should
+    be discarded.
+    """
+    sos = highpass_sos(frequency, sampling, gpass=gpass, gstop=gstop,
+                       fstop=fstop)
+    return sosfiltfilt(sos, numpy.atleast_2d(data), axis=-1)
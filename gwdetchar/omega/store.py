@@ -0,0 +1,417 @@
+# coding=utf-8
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# GW DetChar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GW DetChar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GW DetChar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""HDF5 store of Omega scan data products
+
+Each scan writes the products computed for every significant channel to
+a single HDF5 file, so that plots and HTML can be regenerated, e.g. with
+a different colormap or plot durations, without reading any data again.
+The file holds one group per channel::
+
+    /<channel>                attrs: properties of the loudest tile, and
+                              ``complete``, written last
+        /qgram/<key>          attrs: parameters of the Q-plane
+            /0, /1, ...       energies of each group of rows
+        /eventgram/<key>      tiles, with dtype `~core.TILE_DTYPE`
+        /timeseries/<key>     attrs: x0, dx
+        /asd                  attrs: f0, df
+
+and a ``/prescreen`` table of the channels rejected at pre-screen.
+
+Alongside the store, a `Checkpoint` records every channel that is
+complete, so that a scan that is stopped, e.g. by condor eviction, can
+resume where it left off. An `Eviction` catches the SIGTERM sent on
+eviction, so that the scan stops only between channels.
+"""
+
+from __future__ import division
+
+import os
+import json
+import signal
+import tempfile
+
+import numpy
+
+import h5py
+
+from .core import (QGram, get_plane)
+
+__author__ = 'Alex Urban <alexander.urban@ligo.org>'
+__credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+__all__ = ['STORE_FILENAME', 'CHECKPOINT_FILENAME', 'open_store',
+           'write_channel', 'read_channel', 'has_channel',
+           'write_prescreen',
+           'read_prescreen', 'Checkpoint', 'Eviction', 'reset_sigterm',
+           'EVICTED_STATUS']
+
+STORE_FILENAME = 'omega-products.h5'
+CHECKPOINT_FILENAME = 'checkpoint.json'
+
+# exit status of a scan stopped by SIGTERM
+EVICTED_STATUS = 128 + signal.SIGTERM
+
+PRESCREEN_DTYPE = numpy.dtype([
+    ('channel', 'S128'),
+    ('bound', 'float64'),
+    ('threshold', 'float64'),
+])
+
+PLANE_ATTRS = ('q', 'frange', 'duration', 'sampling', 'mismatch',
+               'multirate')
+
+
+# -- utilities ----------------------------------------------------------------
+
+def open_store(filename=STORE_FILENAME, mode='r', gps=None):
+    """Open an Omega scan store
+
+    Parameters
+    ----------
+    filename : `str`, optional
+        the path of the HDF5 file
+    mode : `str`, optional
+        the mode in which to open the file, as for `h5py.File`
+    gps : `float`, optional
+        the central GPS time of the scan, recorded in a new file
+
+    Returns
+    -------
+    h5file : `h5py.File`
+        the open file, to be closed by the caller
+    """
+    h5file = h5py.File(filename, mode)
+    if gps is not None:
+        h5file.attrs['gps'] = float(gps)
+    return h5file
+
+
+def _write_array(group, name, data, compression='gzip'):
+    """Write an array to a new dataset, compressing it if non-empty
+    """
+    data = numpy.asarray(data)
+    if data.size and compression:
+        return group.create_dataset(name, data=data,
+                                    compression=compression, shuffle=True)
+    return group.create_dataset(name, data=data)
+
+
+# -- channels -----------------------------------------------------------------
+
+def write_channel(h5file, name, params, qgrams, tables, series, asd=None,
+                  compression='gzip'):
+    """Write the data products of one channel
+
+    Any products already stored for this channel are replaced. The group
+    of the channel is marked ``complete`` only once all of its products
+    are written, see `has_channel`.
+
+    Parameters
+    ----------
+    h5file : `h5py.File`, `h5py.Group`
+        the open store
+    name : `str`
+        the name of the channel
+    params : `dict`
+        the properties of the loudest tile
+    qgrams : `dict` of `~gwdetchar.omega.core.QGram`
+        the tile energies of the loudest Q-plane, keyed by representation,
+        e.g. ``'whitened'`` and ``'raw'``
+    tables : `dict` of `numpy.ndarray`
+        the eventgram of each representation
+    series : `dict` of `tuple`
+        the ``(x0, dx, values)`` of each time series, keyed by
+        representation, e.g. ``'raw'``, ``'highpassed'``, ``'whitened'``
+    asd : `tuple`, optional
+        the ``(f0, df, values)`` of the amplitude spectral density
+    compression : `str`, optional
+        the compression filter for each array, as for
+        `h5py.Group.create_dataset`
+    """
+    if name in h5file:
+        del h5file[name]
+    group = h5file.create_group(name)
+    for key, value in params.items():
+        group.attrs[key] = value
+    for key, qgram in qgrams.items():
+        qgroup = group.create_group('qgram/%s' % key)
+        for attr in PLANE_ATTRS:
+            qgroup.attrs[attr] = getattr(qgram.plane, attr)
+        qgroup.attrs['epoch'] = qgram.epoch
+        for i, energy in enumerate(qgram.energies):
+            _write_array(qgroup, str(i), energy, compression=compression)
+    for key, table in tables.items():
+        _write_array(group, 'eventgram/%s' % key, table,
+                     compression=compression)
+    for key, (x0, dx, values) in series.items():
+        dset = _write_array(group, 'timeseries/%s' % key, values,
+                            compression=compression)
+        dset.attrs['x0'] = x0
+        dset.attrs['dx'] = dx
+    if asd is not None:
+        f0, df, values = asd
+        dset = _write_array(group, 'asd', values, compression=compression)
+        dset.attrs['f0'] = f0
+        dset.attrs['df'] = df
+    h5file.flush()
+    group.attrs['complete'] = True
+    h5file.flush()
+
+
+def has_channel(h5file, name):
+    """Return whether all data products of one channel are stored
+
+    Parameters
+    ----------
+    h5file : `h5py.File`, `h5py.Group`
+        the open store
+    name : `str`
+        the name of the channel
+
+    Returns
+    -------
+    stored : `bool`
+        `True` if the channel was completely written by `write_channel`,
+        otherwise `False`, e.g. if writing it was interrupted
+    """
+    return name in h5file and bool(h5file[name].attrs.get('complete',
+                                                         False))
+
+
+def read_channel(h5file, name):
+    """Read the data products of one channel
+
+    Parameters
+    ----------
+    h5file : `h5py.File`, `h5py.Group`
+        the open store
+    name : `str`
+        the name of the channel
+
+    Returns
+    -------
+    products : `dict`
+        the ``'params'``, ``'qgrams'``, ``'tables'``, ``'series'``, and
+        ``'asd'`` of the channel, in the forms given to `write_channel`,
+        or `None` if this channel is not completely stored
+
+    Notes
+    -----
+    Each Q-plane is rebuilt from its parameters, through the default
+    `~gwdetchar.omega.core.PLANE_CACHE`.
+    """
+    if not has_channel(h5file, name):
+        return None
+    group = h5file[name]
+    products = {
+        'params': dict((key, _scalar(value)) for
+                       key, value in group.attrs.items() if
+                       key != 'complete'),
+        'qgrams': {},
+        'tables': {},
+        'series': {},
+        'asd': None,
+    }
+    for key, qgroup in group.get('qgram', {}).items():
+        attrs = qgroup.attrs
+        plane = get_plane(attrs['q'], attrs['frange'], attrs['duration'],
+                          attrs['sampling'], mismatch=attrs['mismatch'],
+                          multirate=bool(attrs['multirate']))
+        energies = [qgroup[str(i)][()] for i in range(len(qgroup))]
+        products['qgrams'][key] = QGram(plane, energies,
+                                        epoch=attrs['epoch'])
+    for key, dset in group.get('eventgram', {}).items():
+        products['tables'][key] = dset[()]
+    for key, dset in group.get('timeseries', {}).items():
+        products['series'][key] = (dset.attrs['x0'], dset.attrs['dx'],
+                                   dset[()])
+    if 'asd' in group:
+        dset = group['asd']
+        products['asd'] = (dset.attrs['f0'], dset.attrs['df'], dset[()])
+    return products
+
+
+def _scalar(value):
+    """Convert a numpy scalar attribute to its python type
+    """
+    try:
+        return value.item()
+    except AttributeError:
+        return value
+
+
+# -- pre-screen ---------------------------------------------------------------
+
+def write_prescreen(h5file, prescreened):
+    """Write the channels rejected at pre-screen
+
+    Parameters
+    ----------
+    h5file : `h5py.File`
+        the open store
+    prescreened : `list` of `tuple`
+        the ``(channel, bound, threshold)`` of each rejected channel
+    """
+    table = numpy.array([(c.encode('utf-8'), b, t) for c, b, t in
+                         prescreened], dtype=PRESCREEN_DTYPE)
+    if 'prescreen' in h5file:
+        del h5file['prescreen']
+    h5file.create_dataset('prescreen', data=table)
+    h5file.flush()
+
+
+def read_prescreen(h5file):
+    """Read the channels rejected at pre-screen
+
+    Returns
+    -------
+    prescreened : `dict`
+        the ``(bound, threshold)`` of each rejected channel, keyed by name
+    """
+    if 'prescreen' not in h5file:
+        return {}
+    return dict((row['channel'].decode('utf-8'),
+                 (float(row['bound']), float(row['threshold']))) for
+                row in h5file['prescreen'][()])
+
+
+# -- checkpoint ---------------------------------------------------------------
+
+def _jsonify(obj):
+    """Convert an object to its JSON representation, e.g. tuples to lists
+    """
+    return json.loads(json.dumps(obj, default=float))
+
+
+class Checkpoint(object):
+    """Record of the channels of an Omega scan that are complete
+
+    Each channel is recorded with the properties of its loudest tile (or
+    `None` if it was removed from the analysis), its timing, and the
+    paths of the files written for it. Its data products are held in the
+    store, which must be flushed before the channel is recorded.
+
+    Parameters
+    ----------
+    filename : `str`, optional
+        the path of the JSON record
+    options : `dict`, optional
+        the settings of this scan, a record written with different
+        settings is not resumed
+    """
+    def __init__(self, filename=CHECKPOINT_FILENAME, options=None):
+        self.filename = filename
+        self.options = _jsonify(options or {})
+        self.channels = {}
+
+    def __len__(self):
+        return sum(len(block) for block in self.channels.values())
+
+    def clear(self):
+        """Forget all recorded channels
+        """
+        self.channels = {}
+
+    def read(self):
+        """Read the record of a previous run of this scan
+
+        Returns
+        -------
+        nchannels : `int`
+            the number of channels recovered, zero if there is no record,
+            or if it was written with different options
+        """
+        try:
+            with open(self.filename, 'r') as fobj:
+                record = json.load(fobj)
+        except (IOError, OSError, ValueError):
+            return 0
+        if record.get('options') != self.options:
+            return 0
+        self.channels = record['channels']
+        return len(self)
+
+    def write(self):
+        """Write this record to disk, atomically
+        """
+        dirname = os.path.dirname(os.path.abspath(self.filename))
+        fdesc, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fdesc, 'w') as fobj:
+            json.dump({'options': self.options, 'channels': self.channels},
+                      fobj)
+        os.rename(tmp, self.filename)
+
+    def add(self, block, name, params, timing, outputs=()):
+        """Record a channel as complete
+
+        Parameters
+        ----------
+        block : `str`
+            the key of the block holding this channel
+        name : `str`
+            the name of the channel
+        params : `dict` or `None`
+            the properties of the loudest tile, or `None` if this channel
+            was removed from the analysis
+        timing : `dict`
+            the timing of each stage of the analysis
+        outputs : `list` of `str`, optional
+            the paths of the files written for this channel
+        """
+        self.channels.setdefault(block, {})[name] = _jsonify({
+            'params': params,
+            'timing': timing,
+            'outputs': list(outputs),
+        })
+
+    def get(self, block, name):
+        """Return the record of a channel, or `None` if it is not complete
+        """
+        return self.channels.get(block, {}).get(name)
+
+
+# -- eviction -----------------------------------------------------------------
+
+def reset_sigterm():
+    """Restore the default handler of SIGTERM
+
+    This is the ``initializer`` of every worker pool started while an
+    `Eviction` is caught, so that `multiprocessing.Pool.terminate` stops
+    the workers, rather than only setting their copy of the flag.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+class Eviction(object):
+    """Flag raised when SIGTERM is received, e.g. from condor eviction
+
+    The handler installed by `catch` only sets `evicted`, so that the scan
+    can stop at the next point where its progress is saved, see
+    `Checkpoint`. Worker pools must be started with `reset_sigterm`.
+    """
+    def __init__(self):
+        self.evicted = False
+
+    def catch(self):
+        """Install the SIGTERM handler of this `Eviction`
+        """
+        signal.signal(signal.SIGTERM, self._handle)
+
+    def _handle(self, signum, frame):
+        self.evicted = True
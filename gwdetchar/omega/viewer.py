@@ -0,0 +1,314 @@
+# coding=utf-8
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# GW DetChar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# GW DetChar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with GW DetChar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compact data products for the interactive Omega scan viewer
+
+Rather than rendering nine PNG images per plot duration, an interactive
+Omega scan writes one JSON file per channel, holding a quantised
+Q-transform image per duration, the eventgram tiles, and a decimated
+envelope of each time series. These are rendered in the browser by
+``gwdetchar-omega.js``, which switches between views, durations, and
+colour scalings without further requests.
+
+Arrays are stored as base64-encoded, zlib-compressed bytes, see
+`encode_array`.
+"""
+
+from __future__ import division
+
+import os
+import json
+import zlib
+import base64
+
+import numpy
+
+try:
+    from matplotlib import colormaps
+except ImportError:  # matplotlib < 3.5
+    from matplotlib.cm import get_cmap
+else:
+    get_cmap = colormaps.__getitem__
+
+__author__ = 'Alex Urban <alexander.urban@ligo.org>'
+__credits__ = 'Duncan Macleod <duncan.macleod@ligo.org>'
+
+__all__ = ['encode_array', 'decode_array', 'quantize', 'envelope',
+           'colormap_table', 'qscan_images', 'eventgram_tiles',
+           'channel_data', 'data_filename', 'write_data']
+
+# -- encoding -----------------------------------------------------------------
+
+
+def encode_array(array, dtype=None):
+    """Encode an array for JSON, as base64 of its zlib-compressed bytes
+
+    Parameters
+    ----------
+    array : `numpy.ndarray`
+        the array to encode
+    dtype : `str`, optional
+        the type in which to store the array, one of `'uint8'` or
+        `'float32'`, defaults to the type of ``array``
+
+    Returns
+    -------
+    encoded : `dict`
+        the ``'dtype'``, ``'shape'``, and base64 ``'data'`` of the array
+    """
+    array = numpy.ascontiguousarray(array, dtype=dtype)
+    # the browser reads typed arrays in little-endian byte order
+    data = array.astype(array.dtype.newbyteorder('<'), copy=False)
+    return {
+        'dtype': array.dtype.name,
+        'shape': list(array.shape),
+        'data': base64.b64encode(
+            zlib.compress(data.tobytes(), 9)).decode('ascii'),
+    }
+
+
+def decode_array(encoded):
+    """Decode an array encoded by `encode_array`
+    """
+    data = zlib.decompress(base64.b64decode(encoded['data']))
+    dtype = numpy.dtype(encoded['dtype']).newbyteorder('<')
+    return numpy.frombuffer(data, dtype=dtype).reshape(encoded['shape'])
+
+
+def quantize(values, vmax):
+    """Quantise non-negative values to 8 bits on a logarithmic scale
+
+    Values are mapped to ``round(255 * log1p(v) / log1p(vmax))``, which
+    keeps about half of the levels below an energy of 25 even for very
+    loud glitches, and are recovered as ``expm1(q * log1p(vmax) / 255)``.
+
+    Parameters
+    ----------
+    values : `numpy.ndarray`
+        the values to quantise
+    vmax : `float`
+        the value mapped to 255
+
+    Returns
+    -------
+    quantized : `numpy.ndarray`
+        the `uint8` quantised values
+    """
+    scale = 255 / numpy.log1p(max(vmax, 1e-10))
+    levels = numpy.log1p(numpy.clip(values, 0, vmax)) * scale
+    return numpy.round(levels).astype('uint8')
+
+
+# -- products -----------------------------------------------------------------
+
+def envelope(times, values, start, end, nbins=1000):
+    """Return the minimum and maximum of a series in regular time bins
+
+    Parameters
+    ----------
+    times : `numpy.ndarray`
+        the time of each sample
+    values : `numpy.ndarray`
+        the value of each sample
+    start : `float`
+        the start time of the first bin
+    end : `float`
+        the end time of the last bin
+    nbins : `int`, optional
+        the number of bins, if there are fewer samples than this in the
+        given span each bin holds one sample
+
+    Returns
+    -------
+    times : `numpy.ndarray`
+        the central time of each bin
+    low : `numpy.ndarray`
+        the minimum of each bin
+    high : `numpy.ndarray`
+        the maximum of each bin
+    """
+    keep = (times >= start) & (times < end)
+    times, values = numpy.asarray(times)[keep], numpy.asarray(values)[keep]
+    if values.size <= nbins:
+        return times, values, values
+    first = numpy.arange(nbins) * values.size // nbins
+    counts = numpy.diff(numpy.append(first, values.size))
+    return (numpy.add.reduceat(times, first) / counts,
+            numpy.minimum.reduceat(values, first),
+            numpy.maximum.reduceat(values, first))
+
+
+def colormap_table(name):
+    """Return the 256-colour RGB lookup table of a matplotlib colormap
+    """
+    rgba = get_cmap(name)(numpy.linspace(0, 1, 256))
+    return numpy.round(rgba[:, :3] * 255).astype('uint8')
+
+
+def qscan_images(qgram, gps, pranges, shape=(256, 512)):
+    """Interpolate a `~gwdetchar.omega.core.QGram` once for each duration
+
+    Parameters
+    ----------
+    qgram : `~gwdetchar.omega.core.QGram`
+        the tile energies of a single Q-plane
+    gps : `float`
+        the central GPS time of each image
+    pranges : `list` of `float`
+        the duration of each image
+    shape : `tuple` of `int`, optional
+        the ``(frequencies, times)`` shape of each image, frequencies are
+        logarithmically spaced over the frequency range of the plane
+
+    Returns
+    -------
+    images : `list` of `dict`
+        the ``'span'``, maximum energy ``'vmax'``, and encoded, quantised
+        ``'data'`` of each image, see `quantize`
+    """
+    nfreq, ntime = shape
+    fmin, fmax = qgram.plane.frange
+    frequencies = numpy.logspace(numpy.log10(fmin), numpy.log10(fmax),
+                                 num=nfreq, endpoint=False)
+    images = []
+    for span in pranges:
+        _, _, values = qgram.interpolate(
+            span / ntime, frequencies=frequencies,
+            outseg=(gps - span / 2., gps + span / 2.))
+        vmax = float(values.max())
+        images.append({
+            'span': span,
+            'vmax': vmax,
+            'data': encode_array(quantize(values.T, vmax)),
+        })
+    return images
+
+
+def eventgram_tiles(table, gps, span):
+    """Encode the eventgram tiles within a given span
+
+    Parameters
+    ----------
+    table : `numpy.ndarray`, `~gwpy.table.EventTable`
+        the eventgram, with columns as `~gwdetchar.omega.core.TILE_DTYPE`
+    gps : `float`
+        the central GPS time of the span
+    span : `float`
+        the duration over which to keep tiles
+
+    Returns
+    -------
+    tiles : `dict`
+        the encoded `float32` arrays of tile ``'time'`` (relative to
+        ``gps``), ``'frequency'``, ``'duration'``, ``'bandwidth'``, and
+        ``'energy'``
+    """
+    times = numpy.asarray(table['central_time']) - gps
+    duration = numpy.asarray(table['duration'])
+    keep = abs(times) - duration / 2. < span / 2.
+    return {
+        'time': encode_array(times[keep], dtype='float32'),
+        'frequency': encode_array(table['central_freq'][keep],
+                                  dtype='float32'),
+        'duration': encode_array(duration[keep], dtype='float32'),
+        'bandwidth': encode_array(table['bandwidth'][keep],
+                                  dtype='float32'),
+        'energy': encode_array(table['energy'][keep], dtype='float32'),
+    }
+
+
+def channel_data(name, gps, pranges, qgrams, tables, series, q,
+                 colormap='viridis', shape=(256, 512), nbins=1000):
+    """Build the interactive Omega scan data for one channel
+
+    Parameters
+    ----------
+    name : `str`
+        the name of the channel
+    gps : `float`
+        the central GPS time of the scan
+    pranges : `list` of `float`
+        the duration of each view
+    qgrams : `dict` of `~gwdetchar.omega.core.QGram`
+        the tile energies of the loudest Q-plane, keyed by representation,
+        e.g. ``'whitened'`` and ``'raw'``
+    tables : `dict` of `numpy.ndarray`
+        the eventgram of each representation
+    series : `dict` of `tuple`
+        the ``(times, values)`` of each time series, keyed by
+        representation, e.g. ``'raw'``, ``'highpassed'``, ``'whitened'``
+    q : `float`
+        the Q of the loudest plane
+    colormap : `str`, optional
+        the name of the colormap for Q-transforms and eventgrams
+    shape : `tuple` of `int`, optional
+        the ``(frequencies, times)`` shape of each Q-transform image
+    nbins : `int`, optional
+        the number of time bins of each time series envelope
+
+    Returns
+    -------
+    data : `dict`
+        the JSON-serialisable data for the viewer
+    """
+    span = max(pranges)
+    out = {
+        'channel': name,
+        'gps': gps,
+        'q': q,
+        'pranges': list(pranges),
+        'colormap': encode_array(colormap_table(colormap)),
+        'qscan': {},
+        'eventgram': {},
+        'timeseries': {},
+    }
+    for key, qgram in qgrams.items():
+        out['qscan'][key] = {
+            'frange': list(qgram.plane.frange),
+            'images': qscan_images(qgram, gps, pranges, shape=shape),
+        }
+    for key, table in tables.items():
+        out['eventgram'][key] = eventgram_tiles(table, gps, span)
+    for key, (times, values) in series.items():
+        out['timeseries'][key] = []
+        for prange in pranges:
+            btimes, low, high = envelope(times, values, gps - prange / 2.,
+                                         gps + prange / 2., nbins=nbins)
+            out['timeseries'][key].append({
+                'time': encode_array(btimes - gps, dtype='float32'),
+                'low': encode_array(low, dtype='float32'),
+                'high': encode_array(high, dtype='float32'),
+            })
+    return out
+
+
+# -- I/O ----------------------------------------------------------------------
+
+def data_filename(channel, plotdir='plots'):
+    """Return the path of the interactive data file for a channel
+    """
+    chan = channel.replace('-', '_').replace(':', '-')
+    return os.path.join(plotdir, '%s-omega.json' % chan)
+
+
+def write_data(data, filename):
+    """Write interactive Omega scan data to a JSON file
+    """
+    with open(filename, 'w') as fobj:
+        json.dump(data, fobj, separators=(',', ':'))
+    return filename
@@ -99,3 +99,15 @@ def test_add_nproc_option(parser):
     cli.add_nproc_option(parser)
     assert parser.parse_args([]).nproc is 8
     assert parser.parse_args(['-j', '2']).nproc is 2
+
+
+def test_add_image_options(parser):
+    cli.add_image_options(parser)
+    args = parser.parse_args([])
+    assert args.image_format == 'png'
+    assert args.image_dpi is None
+    args = parser.parse_args(['--image-format', 'svg', '--image-dpi', '50'])
+    assert args.image_format == 'svg'
+    assert args.image_dpi == 50.
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--image-format', 'gif'])
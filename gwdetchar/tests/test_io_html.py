@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for `gwdetchar.io.html`
+"""
+
+from matplotlib import use
+use('agg')  # nopep8
+from matplotlib import (image, pyplot)
+
+from ..io import html
+
+
+def test_thumbnail_path():
+    assert html.thumbnail_path('plots/X1-TEST-1.svg') == (
+        'plots/thumbnails/X1-TEST-1.png')
+
+
+def test_save_figure(tmpdir):
+    fig = pyplot.figure(figsize=(8, 4), dpi=100)
+    fig.add_subplot(111).plot([1, 2, 3])
+    path = html.save_figure(fig, str(tmpdir.join('test.png')), dpi=50,
+                            thumbwidth=200)
+    pyplot.close(fig)
+    assert image.imread(path).shape[:2] == (200, 400)
+    assert image.imread(html.thumbnail_path(path)).shape[:2] == (100, 200)
+
+
+def test_thumbnail_img():
+    out = html.thumbnail_img('plots/test.png', style='width: 100%;')
+    assert 'href="plots/test.png"' in out
+    assert 'src="plots/thumbnails/test.png"' in out
+    assert 'loading="lazy"' in out
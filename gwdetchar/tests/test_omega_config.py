@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.config`
+"""
+
+from ..omega import config
+
+CONFIG = """
+[aux]
+channels = X1:AUX-A
+    X1:AUX-B
+
+[gw]
+priority = 10
+channels = X1:GW-A
+    X1:GW-B
+priority-channels = X1:GW-B
+
+[other]
+priority = -1
+channels = X1:OTHER
+"""
+
+
+def test_priority(tmpdir):
+    cfile = tmpdir.join('config.ini')
+    cfile.write(CONFIG)
+    cp = config.OmegaConfigParser(ifo='X1')
+    cp.read([str(cfile)])
+    assert cp.getpriority('aux') == 0
+    assert cp.getpriority('gw') == 10
+    assert cp.getprioritychannels('aux') == []
+    assert cp.getprioritychannels('gw') == ['X1:GW-B']
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.core`
+"""
+
+import numpy
+from numpy import fft as npfft
+from numpy.testing import (assert_allclose, assert_array_equal)
+
+import pytest
+
+from ..omega import core
+
+SAMPLE_RATE = 1024.
+DURATION = 16.
+GLITCH_TIME = 8.
+GLITCH_FREQ = 100.
+
+
+def _glitch_data():
+    """Gaussian noise with a loud sine-Gaussian at `GLITCH_TIME`
+    """
+    numpy.random.seed(0)
+    times = numpy.arange(int(SAMPLE_RATE * DURATION)) / SAMPLE_RATE
+    data = numpy.random.randn(times.size)
+    data += 8 * numpy.exp(-((times - GLITCH_TIME) / .02) ** 2) * numpy.sin(
+        2 * numpy.pi * GLITCH_FREQ * times)
+    return data
+
+
+DATA = _glitch_data()
+# match the normalisation of `TimeSeries.fft`
+FDATA = npfft.rfft(DATA) / DATA.size
+FDATA[1:] *= 2
+TILING = core.QTiling(DURATION, SAMPLE_RATE, qrange=(4, 64),
+                      frange=(10, 300))
+
+
+def _reference_energies(plane, fdata):
+    """Row-by-row Q-transform, as done by `gwpy.signal.qtransform.QTile`
+    """
+    out = []
+    for row, ntiles in enumerate(plane.ntiles):
+        windowed = fdata[plane._data_indices(row)] * plane._window(row)
+        pad = ntiles - windowed.size
+        padded = numpy.pad(windowed, (int((pad - 1) / 2.),
+                                      int((pad + 1) / 2.)), mode='constant')
+        tdenergy = npfft.ifft(npfft.ifftshift(padded))
+        energy = tdenergy.real ** 2 + tdenergy.imag ** 2
+        out.append(energy / numpy.median(energy))
+    return out
+
+
+def test_next_power_of_two():
+    assert_array_equal(core.next_power_of_two([1, 3, 4, 100.5]),
+                       [1, 4, 4, 128])
+
+
+def test_qtiling():
+    assert len(TILING) == TILING.qs.size
+    assert TILING.qs.min() > 4 and TILING.qs.max() < 64
+    for plane in TILING:
+        assert plane.frequencies.min() >= plane.frange[0] - 1 / DURATION
+        assert plane.frequencies.max() <= plane.frange[1]
+        assert_allclose(plane.bandwidths.sum(),
+                        plane.frange[1] - plane.frange[0])
+        # rows with equal tile counts are contiguous
+        assert_array_equal(
+            numpy.concatenate([g.rows for g in plane.groups]),
+            numpy.arange(len(plane)))
+
+
+def test_fft():
+    data = numpy.random.randn(128)
+    spectra = core.QSpectra(0, 1, 128, raw=data)
+    assert 'raw' in spectra
+    assert spectra['raw'] is spectra['raw']
+    assert_allclose(spectra['raw'][1:], 2 * npfft.rfft(data)[1:] / 128)
+    with pytest.raises(ValueError):
+        spectra.add('bad', data[:-1])
+
+
+def test_transform():
+    plane = next(iter(TILING))
+    reference = _reference_energies(plane, FDATA)
+    qgram = plane.transform(FDATA)
+    for group, energy in qgram:
+        for i, row in enumerate(group.rows):
+            assert_allclose(energy[i], reference[row])
+    with pytest.raises(ValueError):
+        plane.transform(FDATA, norm='blah')
+
+
+def test_find_peak():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    assert abs(peak['time'] - GLITCH_TIME) < .01
+    assert abs(peak['frequency'] - GLITCH_FREQ) < 10
+    assert peak['q'] == qgram.plane.q
+    assert_allclose(peak['snr'], (2 * peak['energy']) ** (1/2.))
+    with pytest.raises(core.NoPeakError):
+        core.find_peak(TILING, numpy.zeros_like(FDATA), 0, GLITCH_TIME,
+                       norm=False)
+
+
+def test_eventgram():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    tiles = core.eventgram(qgram, snrthresh=5.5)
+    assert tiles.dtype == core.TILE_DTYPE
+    assert (tiles['energy'] >= 5.5 ** 2 / 2).all()
+    assert tiles['energy'].max() >= peak['energy']
+    assert peak['energy'] in tiles['energy']
+
+
+def test_interpolate():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    times, freqs, values = qgram.interpolate(
+        .01, fres=1., outseg=(GLITCH_TIME - 1, GLITCH_TIME + 1))
+    assert values.shape == (times.size, freqs.size)
+    assert_allclose(times[[0, -1]], [GLITCH_TIME - 1, GLITCH_TIME + .99])
+    assert freqs[0] == qgram.plane.frange[0]
+    assert abs(values.max() - peak['energy']) / peak['energy'] < .25
+    # native frequency rows
+    times, freqs, values = qgram.interpolate(.01)
+    assert_array_equal(freqs, qgram.plane.frequencies)
+
+
+def test_interpolate_span():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    times, freqs, full = qgram.interpolate(.01, fres=1.)
+    # a cropped span matches the full interpolation
+    start = numpy.searchsorted(times, GLITCH_TIME - 1)
+    ctimes, _, values = qgram.interpolate(
+        .01, fres=1., outseg=(times[start], times[start] + 2))
+    assert_allclose(ctimes, times[start:start + ctimes.size])
+    assert_allclose(values, full[start:start + ctimes.size],
+                    rtol=1e-3, atol=1e-3 * peak['energy'])
+    # a coarse grid keeps the loudest tiles
+    _, _, coarse = qgram.interpolate(.5, fres=1.)
+    assert coarse.shape[0] == DURATION / .5
+    assert coarse.max() > .5 * peak['energy']
+
+
+def test_multirate():
+    plane = next(iter(TILING))
+    mrplane = core.QPlane(plane.q, plane.frange, DURATION, SAMPLE_RATE,
+                          multirate=True)
+    assert (mrplane.nsamples <= plane.ntiles).all()
+    qgram = mrplane.transform(FDATA, norm=False)
+    for group, energy in list(qgram)[:3]:
+        for i, row in enumerate(group.rows):
+            # evaluate the default-rate transform directly at these times
+            windowed = FDATA[plane._data_indices(row)] * plane._window(row)
+            half = (windowed.size - 1) // 2
+            phase = numpy.exp(2j * numpy.pi * numpy.outer(
+                numpy.arange(group.nsamples),
+                numpy.arange(-half, half + 1)) / group.nsamples)
+            reference = abs(phase.dot(windowed) / plane.ntiles[row]) ** 2
+            assert_allclose(energy[i], reference)
+    # the loudest tile is found at the right place
+    mrtiling = core.QTiling(DURATION, SAMPLE_RATE, qrange=(4, 64),
+                            frange=(10, 300), multirate=True)
+    qgram, peak = core.find_peak(mrtiling, FDATA, 0, GLITCH_TIME)
+    assert abs(peak['time'] - GLITCH_TIME) < .02
+
+
+@pytest.mark.parametrize('norm, nmedian', [
+    (True, 1e6),
+    ('mean', 4096),
+    (False, 4096),
+])
+def test_window_energy(norm, nmedian):
+    plane = list(TILING)[-1]
+    qgram = plane.transform(FDATA, norm=norm)
+    for group, energy in qgram:
+        first, last = group.nsamples // 3, group.nsamples // 2 + 1
+        assert_allclose(
+            group.window_energy(FDATA, first, last, norm=norm,
+                                nmedian=nmedian),
+            energy[:, first:last])
+
+
+def test_find_loudest_plane():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    plane, ppeak = core.find_loudest_plane(TILING, FDATA, 0, GLITCH_TIME,
+                                           nmedian=256)
+    assert plane.q == qgram.plane.q
+    assert ppeak['time'] == peak['time']
+    assert ppeak['frequency'] == peak['frequency']
+    assert abs(ppeak['energy'] - peak['energy']) / peak['energy'] < .1
+    with pytest.raises(core.NoPeakError):
+        core.find_loudest_plane(TILING, numpy.zeros_like(FDATA), 0,
+                                GLITCH_TIME, norm=False)
+
+
+def test_threaded_search():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    tqgram, tpeak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME, nthreads=4)
+    assert tqgram.plane.q == qgram.plane.q
+    for (_, tenergy), (_, energy) in zip(tqgram, qgram):
+        assert_array_equal(tenergy, energy)
+    assert tpeak == peak
+    plane, ppeak = core.find_loudest_plane(TILING, FDATA, 0, GLITCH_TIME)
+    tplane, tppeak = core.find_loudest_plane(TILING, FDATA, 0, GLITCH_TIME,
+                                             nthreads=4)
+    assert tplane.q == plane.q
+    assert tppeak == ppeak
+
+
+def test_prescreen():
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    bound = core.prescreen(TILING, FDATA, 0, GLITCH_TIME)
+    assert bound >= peak['energy']
+    # quiet data pass the pre-screen only at a much lower energy
+    noise = core.fft(numpy.random.RandomState(1).randn(FDATA.size * 2 - 2))
+    assert core.prescreen(TILING, noise, 0, GLITCH_TIME) < peak['energy']
+    with pytest.raises(ValueError):
+        core.prescreen(TILING, FDATA, 0, GLITCH_TIME, mismatch=1)
+
+
+def test_hierarchical_search():
+    plane, peak = core.find_loudest_plane(TILING, FDATA, 0, GLITCH_TIME)
+    hplane, hpeak = core.hierarchical_search(TILING, FDATA, 0, GLITCH_TIME)
+    assert hplane.q == plane.q
+    assert len(hplane) == len(plane)
+    assert hpeak['energy'] >= (1 - TILING.mismatch) * peak['energy']
+    with pytest.raises(ValueError):
+        core.hierarchical_search(TILING, FDATA, 0, GLITCH_TIME, coarse=.1)
+
+
+def test_qplane_band():
+    plane = list(TILING)[1]
+    band = core.QPlane(plane.q, plane.frange, DURATION, SAMPLE_RATE,
+                       band=(90, 110))
+    rows = numpy.concatenate([g.rows for g in band.groups])
+    assert 0 < rows.size < len(plane)
+    assert (band.fedges[rows + 1] > 90).all()
+    assert (band.fedges[rows] < 110).all()
+    full = {}
+    for group, energy in plane.transform(FDATA):
+        full.update(zip(group.rows, energy))
+    for group, energy in band.transform(FDATA):
+        for i, row in enumerate(group.rows):
+            assert_allclose(energy[i], full[row])
+
+
+def test_single_precision():
+    fdata = core.fft(DATA.astype('float32'))
+    assert fdata.dtype == numpy.complex64
+    assert_allclose(fdata, FDATA, atol=1e-6)
+    qgram, peak = core.find_peak(TILING, FDATA, 0, GLITCH_TIME)
+    sqgram, speak = core.find_peak(TILING, fdata, 0, GLITCH_TIME)
+    assert sqgram.plane.q == qgram.plane.q
+    for (_, senergy), (_, energy) in zip(sqgram, qgram):
+        assert senergy.dtype == numpy.float32
+        assert_allclose(senergy, energy, rtol=1e-3, atol=1e-3)
+    assert speak['time'] == peak['time']
+    assert_allclose(speak['energy'], peak['energy'], rtol=1e-4)
+    times, freqs, values = sqgram.interpolate(.01, fres=1.)
+    assert values.dtype == numpy.float32
+
+
+def test_plane_cache(tmpdir):
+    cache = core.PlaneCache(maxsize=2, cachedir=str(tmpdir))
+    plane = cache.get(8, (10, 300), DURATION, SAMPLE_RATE)
+    assert cache.get(8., [10, 300], DURATION, SAMPLE_RATE) is plane
+    assert len(tmpdir.listdir()) == 1
+    cache.get(16, (10, 300), DURATION, SAMPLE_RATE)
+    cache.get(32, (10, 300), DURATION, SAMPLE_RATE)
+    assert len(cache) == 2
+    # evicted from memory, but read back from disk
+    replane = cache.get(8, (10, 300), DURATION, SAMPLE_RATE)
+    assert replane is not plane
+    for (_, renergy), (_, energy) in zip(replane.transform(FDATA),
+                                         plane.transform(FDATA)):
+        assert_array_equal(renergy, energy)
+    # tilings share planes through the default cache
+    assert next(iter(TILING)) is next(iter(TILING))
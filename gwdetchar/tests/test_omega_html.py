@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for `gwdetchar.omega.html`
+"""
+
+import os
+import json
+
+from ..omega import html
+
+
+class _Block(object):
+    def __init__(self, name):
+        self.name = name
+        self.key = name.lower().replace(' ', '-')
+
+
+class _Channel(object):
+    def __init__(self, name, energy):
+        self.name = name
+        self.energy = energy
+        self.snr = (2 * energy) ** (1/2.)
+        self.f = 100.
+        self.Q = 5.7
+
+
+def test_write_qscan_shell(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    blocks = [_Block('GW'), _Block('Seismic Sensors')]
+    index = html.write_qscan_shell('L1', 0, blocks)
+    assert os.path.isfile(index)
+    with open('_inner.html') as fobj:
+        content = fobj.read()
+    for block in blocks:
+        # each table of contents link has a placeholder to land on
+        assert 'href="#block-%s"' % block.key in content
+        assert 'id="block-%s"' % block.key in content
+        assert 'id="fragment-%s"' % block.key in content
+        assert 'data-src="%s"' % html.fragment_path(block.key) in content
+    assert 'id="fragment-prescreen"' in content
+    assert "loadQscanFragments('status.json');" in content
+
+
+def test_write_fragment(tmpdir, monkeypatch):
+    renamed = []
+    rename = os.rename
+
+    def _rename(src, dst):
+        renamed.append((src, dst))
+        return rename(src, dst)
+
+    monkeypatch.setattr(os, 'rename', _rename)
+    outdir = str(tmpdir)
+    for content in ('<p>first</p>', '<p>second</p>'):
+        path = html.write_fragment('gw', content, outdir=outdir)
+    assert path == os.path.join(outdir, 'blocks', 'gw.html')
+    with open(path) as fobj:
+        assert fobj.read() == '<p>second</p>'
+    # written to a temporary file, then moved into place
+    assert renamed == [('%s.tmp' % path, path)] * 2
+    assert os.listdir(os.path.dirname(path)) == ['gw.html']
+
+
+def test_write_status(tmpdir):
+    outdir = str(tmpdir)
+    path = html.write_status({'gw': 1, 'prescreen': 0}, empty=['seismic'],
+                             outdir=outdir)
+    assert path == os.path.join(outdir, 'status.json')
+    with open(path) as fobj:
+        status = json.load(fobj)
+    assert status['fragments'] == {'gw': 1, 'prescreen': 0}
+    assert status['empty'] == ['seismic']
+    assert status['complete'] is False
+    assert 'updated' in status
+    html.write_status({'gw': 2}, complete=True, outdir=outdir)
+    with open(path) as fobj:
+        status = json.load(fobj)
+    assert status['fragments'] == {'gw': 2}
+    assert status['empty'] == []
+    assert status['complete'] is True
+
+
+def test_write_batch_index(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    scans = [
+        (1000000000.0, '1000000000.0',
+         [_Channel('X1:QUIET', 20.), _Channel('X1:LOUD', 50.)]),
+        (1000000100.0, '1000000100.0', []),
+    ]
+    index = html.write_batch_index('L1', '1000000000.0-1000000100.0',
+                                   scans, snrs=[8., 12.])
+    assert os.path.isfile(index)
+    with open('_inner.html') as fobj:
+        content = fobj.read()
+    assert 'Trigger SNR' in content
+    for gpstime, path, _ in scans:
+        assert 'href="%s/"' % path in content
+    # each scan lists its loudest channel, or nothing
+    assert 'X1:LOUD' in content
+    assert 'X1:QUIET' not in content
+    assert '<td>50.0</td>' in content
+    assert '<td>10.0</td>' in content
+    assert 'colspan="5"' in content
+    assert '<td>12.0</td>' in content
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.plan`
+"""
+
+import time
+
+import numpy
+import pytest
+
+from ..omega import plan
+
+GPS = 1000000000
+
+
+def test_data_window():
+    # short blocks are limited by the ASD
+    start, end = plan.data_window(GPS, 8, 2, naverages=64)
+    assert (start, end) == (GPS - 33., GPS + 33.)
+    # long blocks are limited by their duration and settling time
+    start, end = plan.data_window(GPS, 64, 1, highpass=4, naverages=8)
+    assert (start, end) == (GPS - 41.25, GPS + 41.25)
+    # and never exceed the original padding
+    with pytest.warns(UserWarning):
+        start, end = plan.data_window(GPS, 64, 8, highpass=.01)
+    assert (start, end) == (GPS - 258., GPS + 258.)
+
+
+def test_filter_padding():
+    assert plan.filter_padding(2) == (2, 2)
+    # the window holds the data high-passed before whitening, for a low
+    # corner frequency whose settling time exceeds the FFT length
+    duration, fftlength, corner = 32, 2, 4
+    wpad, hpad = plan.filter_padding(fftlength, highpass=corner)
+    assert wpad == fftlength
+    assert hpad == fftlength + plan.SETTLE_CYCLES / corner
+    start, end = plan.data_window(GPS, duration, fftlength, highpass=corner,
+                                  naverages=8)
+    assert start <= GPS - duration / 2. - hpad
+    assert end >= GPS + duration / 2. + hpad
+
+
+def test_plan_reads():
+    reads = plan.plan_reads([
+        ('X1_R', ['X1:A', 'X1:B'], (GPS - 10, GPS + 10), 'a'),
+        ('X1_M', ['X1:C'], (GPS - 10, GPS + 10), 'b'),
+        ('X1_R', ['X1:B', 'X1:D'], (GPS - 40, GPS + 20), 'c'),
+        ('X1_R', ['X1:E'], (GPS + 100, GPS + 120), 'd'),
+    ])
+    assert [r.frametype for r in reads] == ['X1_R', 'X1_M', 'X1_R']
+    assert reads[0].channels == ['X1:A', 'X1:B', 'X1:D']
+    assert (reads[0].start, reads[0].end) == (GPS - 40, GPS + 20)
+    assert reads[0].span == 60
+    assert reads[0].tags == ['a', 'c']
+    assert reads[2].tags == ['d']
+    # windows separated by a short gap are read through
+    reads = plan.plan_reads([
+        ('X1_R', ['X1:A'], (GPS - 10, GPS + 10), 'a'),
+        ('X1_R', ['X1:A'], (GPS + 15, GPS + 30), 'b'),
+    ], maxgap=10)
+    assert len(reads) == 1
+    assert (reads[0].start, reads[0].end) == (GPS - 10, GPS + 30)
+
+
+def test_read_times(tmpdir):
+    # times given on the command line
+    times, snrs = plan.read_times(['%s' % (GPS + 1), '%s' % GPS,
+                                   '%s' % (GPS + 1)])
+    assert times == [GPS, GPS + 1]
+    assert snrs is None
+    # or in a file of GPS times
+    tfile = tmpdir.join('times.txt')
+    tfile.write('%s\n%s.5\n%s\n' % (GPS + 10, GPS, GPS + 10))
+    times, snrs = plan.read_times([str(tfile)])
+    assert times == [GPS + .5, GPS + 10]
+    assert snrs is None
+    tfile.write('%s\n' % GPS)
+    assert plan.read_times([str(tfile)]) == ([GPS], None)
+
+
+def test_cluster_windows():
+    windows = [(GPS + 100, GPS + 140), (GPS - 20, GPS + 20),
+               (GPS + 10, GPS + 50), (GPS + 45, GPS + 85)]
+    # overlapping windows are chained together, in order of time
+    assert plan.cluster_windows(windows) == [[1, 2, 3], [0]]
+    # windows separated by a short gap are read through
+    assert plan.cluster_windows(windows, maxgap=20) == [[1, 2, 3, 0]]
+    # clusters never span more than the maximum
+    assert plan.cluster_windows(windows, maxspan=80) == [[1, 2], [3], [0]]
+    assert plan.cluster_windows([]) == []
+
+
+def test_read_group():
+    reads = plan.plan_reads([
+        ('X1_R', ['X1:A', 'X1:B'], (GPS - 10, GPS + 10), 'a'),
+        ('X1_M', ['X1:C'], (GPS - 20, GPS + 20), 'b'),
+    ])
+    group = plan.ReadGroup(reads, tag=[0, 1])
+    assert group.channels == ['X1:A', 'X1:B', 'X1:C']
+    assert group.extent == 2 * 20 + 40
+    assert group.tag == [0, 1]
+
+
+def _reads(n, nchan=2, span=10):
+    reads = []
+    for i in range(n):
+        read = plan.DataRead('X1_R')
+        read.add(['X1:%d' % j for j in range(nchan)], i * span,
+                 (i + 1) * span, tag=i)
+        reads.append(read)
+    return reads
+
+
+def test_prefetcher():
+    reads = _reads(4)
+    log = []
+
+    def reader(read):
+        log.append(read.tags[0])
+        return dict((name, numpy.zeros(int(read.span))) for
+                    name in read.channels)
+
+    # without read-ahead, each read happens as it is needed
+    for read, data in plan.Prefetcher(reads, reader):
+        assert log[-1] == read.tags[0]
+        assert sorted(data) == read.channels
+    # with read-ahead, reads happen in order ahead of use
+    del log[:]
+    for read, data in plan.Prefetcher(reads, reader, depth=2):
+        assert set(data) == set(read.channels)
+    assert log == [0, 1, 2, 3]
+
+
+def test_prefetcher_memory():
+    reads = _reads(3)
+    held = []
+
+    def reader(read):
+        held.append(read.tags[0])
+        return dict((name, numpy.zeros(int(read.span))) for
+                    name in read.channels)
+
+    # each read is 160 bytes, so none fits alongside another
+    prefetcher = plan.Prefetcher(reads, reader, depth=2, maxbytes=200)
+    for read, data in prefetcher:
+        time.sleep(.05)
+        assert held[-1] == read.tags[0]
+    assert held == [0, 1, 2]
+    # with room for two, the next read is started while one is in use
+    prefetcher = plan.Prefetcher(reads, reader, depth=2, maxbytes=400)
+    del held[:]
+    for read, data in prefetcher:
+        time.sleep(.05)
+        if read.tags[0] == 1:
+            assert held == [0, 1, 2]
+
+
+def test_prefetcher_groups():
+    groups = [plan.ReadGroup(_reads(2), tag=i) for i in range(3)]
+
+    def reader(group):
+        data = {}
+        for read in group.reads:
+            data.update(('%s-%s' % (name, read.tags[0]),
+                         numpy.zeros(int(read.span))) for
+                        name in read.channels)
+        return data
+
+    # each group is 320 bytes, so none fits alongside another
+    prefetcher = plan.Prefetcher(groups, reader, depth=2, maxbytes=400)
+    out = [(group.tag, sorted(data)) for group, data in prefetcher]
+    assert out == [(i, ['X1:0-0', 'X1:0-1', 'X1:1-0', 'X1:1-1']) for
+                   i in range(3)]
+    assert prefetcher.estimate(groups[0]) == 320
+
+
+def test_prefetcher_error():
+    def reader(read):
+        raise ValueError(read.frametype)
+
+    with pytest.raises(ValueError):
+        for read, data in plan.Prefetcher(_reads(2), reader, depth=1):
+            pass
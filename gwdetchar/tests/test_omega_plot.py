@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.plot`
+"""
+
+import os
+
+import numpy
+from numpy.testing import assert_array_equal
+
+import pytest
+
+from gwpy.spectrogram import Spectrogram
+
+from ..io.html import thumbnail_path
+from ..omega import plot
+
+NAN = numpy.nan
+
+
+def test_rasterize_tiles():
+    image = plot.rasterize_tiles(
+        [1, 2.5], [4, 4], [2, 1], [4, 2], [3, 5], (0, 4), (0, 8), (8, 4))
+    assert_array_equal(image, [
+        [NAN, NAN, NAN, NAN],
+        [NAN, NAN, NAN, NAN],
+        [3, 3, NAN, NAN],
+        [3, 3, 5, NAN],
+        [3, 3, 5, NAN],
+        [3, 3, NAN, NAN],
+        [NAN, NAN, NAN, NAN],
+        [NAN, NAN, NAN, NAN],
+    ])
+    # overlapping tiles keep the largest value
+    image = plot.rasterize_tiles(
+        [0, 0], [0, 0], [4, 2], [8, 4], [3, 5], (0, 4), (0, 8), (8, 4),
+        anchor='ll')
+    assert_array_equal(image[:4, :2], 5)
+    assert_array_equal(image[4:, :], 3)
+    # tiles smaller than a pixel still cover one pixel
+    image = plot.rasterize_tiles(
+        [10.1], [100.1], [.01], [.01], [1], (0, 20), (10, 1000), (2, 2),
+        logy=True)
+    assert_array_equal(image, [[NAN, NAN], [NAN, 1]])
+    with pytest.raises(ValueError):
+        plot.rasterize_tiles([0], [0], [1], [1], [1], (0, 1), (0, 1), (1, 1),
+                             anchor='blah')
+
+
+def test_omega_plots(tmpdir, monkeypatch):
+    gps, spans = 100, [1, 4]
+    specgrams = []
+    for span in spans:
+        specgram = Spectrogram(
+            numpy.random.RandomState(span).rand(500, 50),
+            x0=gps - span / 2., dx=span / 500., f0=10, df=2)
+        specgram.q = 8
+        specgrams.append(specgram)
+    outputs = [str(tmpdir.join('qscan-%d.png' % span)) for span in spans]
+    xlims = []
+    save_figure = plot.save_figure
+
+    def _save_figure(fig, path, **kwargs):
+        xlims.append(fig.gca().get_xlim())
+        return save_figure(fig, path, **kwargs)
+
+    monkeypatch.setattr(plot, 'save_figure', _save_figure)
+    plot.omega_plots(specgrams, gps, spans, 'X1:TEST', outputs, qscan=True,
+                     figsize=[4, 3], dpi=50)
+    for output in outputs:
+        assert os.path.isfile(output)
+        assert os.path.isfile(thumbnail_path(output))
+    assert [tuple(x) for x in xlims] == [
+        (gps - span / 2., gps + span / 2.) for span in spans]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.spectral`
+"""
+
+import numpy
+import pytest
+from numpy.testing import assert_allclose
+
+from scipy.signal import lfilter, butter, welch
+
+from ..omega import spectral
+
+SAMPLE_RATE = 1024
+FFTLENGTH = 2
+NFFT = FFTLENGTH * SAMPLE_RATE
+
+
+def _noise(nrows=3, duration=64):
+    numpy.random.seed(0)
+    scale = numpy.arange(1, nrows + 1)[:, numpy.newaxis]
+    return numpy.random.randn(nrows, duration * SAMPLE_RATE) * scale
+
+
+def test_median_bias():
+    assert spectral.median_bias(1) == 1
+    assert spectral.median_bias(2) == 1
+    assert_allclose(spectral.median_bias(3), 1 - 1/2. + 1/3.)
+
+
+def test_median_mean_asd():
+    data = _noise()
+    asd = spectral.median_mean_asd(data, NFFT, dt=1./SAMPLE_RATE)
+    assert asd.shape == (3, NFFT // 2 + 1)
+    # white noise has a flat one-sided ASD of sqrt(2 sigma^2 dt)
+    expected = numpy.sqrt(2. / SAMPLE_RATE) * numpy.arange(1, 4)
+    assert_allclose(asd[:, 1:-1].mean(axis=1), expected, rtol=.02)
+    # each row is estimated independently
+    assert_allclose(spectral.median_mean_asd(data[1], NFFT,
+                                             dt=1./SAMPLE_RATE)[0], asd[1])
+    with pytest.raises(ValueError):
+        spectral.median_mean_asd(data[:, :NFFT], NFFT)
+
+
+def test_whiten():
+    data = _noise()
+    # colour the first row
+    b, a = butter(4, 50. / (SAMPLE_RATE / 2.))
+    data[0] = lfilter(b, a, data[0]) * 100 + data[0] * .01
+    asd = spectral.median_mean_asd(data, NFFT, dt=1./SAMPLE_RATE)
+    whitened = spectral.whiten(data, asd, 1. / FFTLENGTH,
+                               dt=1./SAMPLE_RATE)
+    assert whitened.shape == data.shape
+    # away from the edges, each row is whitened to unit variance
+    inner = whitened[:, NFFT:-NFFT]
+    assert_allclose(inner.std(axis=1), 1, rtol=.02)
+    _, psd = welch(inner[0], fs=SAMPLE_RATE, nperseg=NFFT)
+    assert_allclose(numpy.median(psd[5:-5]), 2. / SAMPLE_RATE, rtol=.05)
+    # rows with a zero ASD are removed
+    zeros = spectral.whiten(data[:1], numpy.zeros((1, NFFT // 2 + 1)),
+                            1. / FFTLENGTH, dt=1./SAMPLE_RATE)
+    assert not zeros.any()
+
+
+def test_highpass_sos():
+    spectral.FILTER_CACHE.clear()
+    sos = spectral.highpass_sos(10, SAMPLE_RATE, gpass=.5, gstop=100)
+    assert sos.shape[1] == 6
+    # each design is made once
+    assert spectral.highpass_sos(10, SAMPLE_RATE, gpass=.5,
+                                 gstop=100) is sos
+    assert len(spectral.FILTER_CACHE) == 1
+    spectral.highpass_sos(10, SAMPLE_RATE * 2, gpass=.5, gstop=100)
+    assert len(spectral.FILTER_CACHE) == 2
+
+
+def test_highpass():
+    data = _noise()
+    times = numpy.arange(data.shape[-1]) / float(SAMPLE_RATE)
+    data += 100 * numpy.sin(2 * numpy.pi * .5 * times)
+    filtered = spectral.highpass(data, 8, SAMPLE_RATE, gpass=.5, gstop=100)
+    assert filtered.shape == data.shape
+    # each row is filtered independently
+    assert_allclose(spectral.highpass(data[1], 8, SAMPLE_RATE, gpass=.5,
+                                      gstop=100)[0], filtered[1])
+    # the low-frequency sinusoid is removed, away from the edges
+    inner = filtered[:, 8 * SAMPLE_RATE:-8 * SAMPLE_RATE]
+    assert_allclose(inner.std(axis=1), numpy.arange(1, 4), rtol=.15)
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.store`
+"""
+
+import os
+import sys
+import time
+import signal
+import subprocess
+
+import numpy
+from numpy.testing import (assert_allclose, assert_array_equal)
+
+from ..omega import (core, store)
+
+DURATION = 16
+SAMPLE_RATE = 1024
+GPS = 8
+CHANNEL = 'X1:TEST-CHANNEL'
+
+
+def _products():
+    numpy.random.seed(0)
+    times = numpy.arange(DURATION * SAMPLE_RATE) / SAMPLE_RATE
+    data = numpy.random.randn(times.size)
+    data += 8 * numpy.exp(-((times - GPS) / .02) ** 2) * numpy.sin(
+        2 * numpy.pi * 100 * times)
+    tiling = core.QTiling(DURATION, SAMPLE_RATE, frange=(10, 300),
+                          multirate=True)
+    qgram, peak = core.find_peak(tiling, core.fft(data), 0, GPS)
+    return {
+        'params': {'Q': peak['q'], 'energy': peak['energy'],
+                   't': peak['time']},
+        'qgrams': {'whitened': qgram},
+        'tables': {'whitened': core.eventgram(qgram),
+                   'raw': core.eventgram(qgram, snrthresh=1e3)},
+        'series': {'whitened': (0., 1. / SAMPLE_RATE, data)},
+        'asd': (0., .5, numpy.ones(1025)),
+    }
+
+
+def test_channel(tmpdir):
+    products = _products()
+    filename = str(tmpdir.join('test.h5'))
+    h5file = store.open_store(filename, mode='w', gps=GPS)
+    store.write_channel(h5file, CHANNEL, **products)
+    # rewriting a channel replaces it
+    store.write_channel(h5file, CHANNEL, **products)
+    h5file.close()
+
+    h5file = store.open_store(filename)
+    assert h5file.attrs['gps'] == GPS
+    assert store.read_channel(h5file, 'X1:MISSING') is None
+    assert store.has_channel(h5file, CHANNEL)
+    out = store.read_channel(h5file, CHANNEL)
+    h5file.close()
+    assert out['params'] == products['params']
+    # the Q-plane is rebuilt with the same tiling and energies
+    qgram, stored = products['qgrams']['whitened'], out['qgrams']['whitened']
+    assert stored.plane.q == qgram.plane.q
+    assert stored.plane.multirate
+    assert_array_equal(stored.plane.frequencies, qgram.plane.frequencies)
+    for a, b in zip(stored.energies, qgram.energies):
+        assert_array_equal(a, b)
+    assert stored.peak(GPS - .25, GPS + .25) == qgram.peak(GPS - .25,
+                                                         GPS + .25)
+    assert_array_equal(out['tables']['whitened'],
+                       products['tables']['whitened'])
+    assert out['tables']['raw'].size == 0
+    x0, dx, values = out['series']['whitened']
+    assert (x0, dx) == products['series']['whitened'][:2]
+    assert_allclose(values, products['series']['whitened'][2])
+    assert out['asd'][1] == .5
+
+
+def test_incomplete_channel(tmpdir):
+    filename = str(tmpdir.join('test.h5'))
+    h5file = store.open_store(filename, mode='w', gps=GPS)
+    # a group left part-written, e.g. by eviction, is not stored
+    h5file.create_group(CHANNEL).attrs['Q'] = 5.
+    assert not store.has_channel(h5file, CHANNEL)
+    assert store.read_channel(h5file, CHANNEL) is None
+    store.write_channel(h5file, CHANNEL, **_products())
+    assert store.has_channel(h5file, CHANNEL)
+    h5file.close()
+
+
+def test_prescreen(tmpdir):
+    filename = str(tmpdir.join('test.h5'))
+    h5file = store.open_store(filename, mode='w')
+    assert store.read_prescreen(h5file) == {}
+    store.write_prescreen(h5file, [(CHANNEL, 10., 20.)])
+    h5file.close()
+    h5file = store.open_store(filename)
+    assert store.read_prescreen(h5file) == {CHANNEL: (10., 20.)}
+    h5file.close()
+
+
+def test_checkpoint(tmpdir):
+    filename = str(tmpdir.join('checkpoint.json'))
+    options = {'gps': GPS, 'mismatch': (.2, .4)}
+    checkpoint = store.Checkpoint(filename, options=options)
+    assert checkpoint.read() == 0
+    checkpoint.add('block', CHANNEL, {'Q': numpy.float32(5.7)},
+                   {'search': 1.5}, outputs=['plots/test.png'])
+    checkpoint.add('block', 'X1:REJECTED', None, {'bound': 10.})
+    checkpoint.write()
+    assert len(checkpoint) == 2
+    # a run with the same options recovers each channel
+    resumed = store.Checkpoint(filename, options=options)
+    assert resumed.read() == 2
+    record = resumed.get('block', CHANNEL)
+    assert_allclose(record['params']['Q'], 5.7, rtol=1e-6)
+    assert record['outputs'] == ['plots/test.png']
+    assert resumed.get('block', 'X1:REJECTED')['params'] is None
+    assert resumed.get('other', CHANNEL) is None
+    # a run with different options starts again
+    assert store.Checkpoint(filename, options={'gps': 0}).read() == 0
+    resumed.clear()
+    assert len(resumed) == 0
+
+
+EVICTED_SCAN = """
+import sys
+import time
+import multiprocessing
+from gwdetchar.omega import store
+
+eviction = store.Eviction()
+eviction.catch()
+pool = multiprocessing.Pool(2, initializer=store.reset_sigterm)
+result = pool.map_async(time.sleep, [60, 60])
+print('ready')
+sys.stdout.flush()
+while not eviction.evicted:
+    time.sleep(.01)
+pool.terminate()
+pool.join()
+sys.exit(store.EVICTED_STATUS)
+"""
+
+
+def test_eviction():
+    # a scan with a worker pool exits cleanly on SIGTERM
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(store.__file__))))
+    proc = subprocess.Popen([sys.executable, '-c', EVICTED_SCAN], cwd=root,
+                            stdout=subprocess.PIPE)
+    assert proc.stdout.readline().strip() == b'ready'
+    os.kill(proc.pid, signal.SIGTERM)
+    deadline = time.time() + 30
+    while proc.poll() is None and time.time() < deadline:
+        time.sleep(.1)
+    if proc.poll() is None:  # the workers did not stop
+        proc.kill()
+        proc.wait()
+    assert proc.returncode == store.EVICTED_STATUS == 143
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) Alex Urban (2018)
+#
+# This file is part of the GW DetChar python package.
+#
+# gwdetchar is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# gwdetchar is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with gwdetchar.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for :mod:`gwdetchar.omega.viewer`
+"""
+
+import json
+
+import numpy
+from numpy.testing import (assert_allclose, assert_array_equal)
+
+from ..omega import (core, viewer)
+
+DURATION = 16
+SAMPLE_RATE = 1024
+GPS = 8
+
+
+def _data():
+    numpy.random.seed(0)
+    times = numpy.arange(DURATION * SAMPLE_RATE) / SAMPLE_RATE
+    data = numpy.random.randn(times.size)
+    data += 8 * numpy.exp(-((times - GPS) / .02) ** 2) * numpy.sin(
+        2 * numpy.pi * 100 * times)
+    return times, data
+
+
+def test_encode_array():
+    array = numpy.random.randn(3, 4).astype('float32')
+    encoded = viewer.encode_array(array)
+    assert encoded['dtype'] == 'float32'
+    assert encoded['shape'] == [3, 4]
+    assert_array_equal(viewer.decode_array(json.loads(json.dumps(encoded))),
+                       array)
+
+
+def test_quantize():
+    values = numpy.array([0, 25, 1000, 2000])
+    levels = viewer.quantize(values, 1000)
+    assert_array_equal(levels[[0, 2, 3]], [0, 255, 255])
+    assert 100 < levels[1] < 140
+    recovered = numpy.expm1(levels * numpy.log1p(1000) / 255)
+    assert abs(recovered[1] - 25) / 25 < .02
+
+
+def test_envelope():
+    times = numpy.arange(100.)
+    values = numpy.arange(100.) % 10
+    btimes, low, high = viewer.envelope(times, values, 0, 100, nbins=10)
+    assert_array_equal(low, 0)
+    assert_array_equal(high, 9)
+    assert_allclose(btimes, numpy.arange(10) * 10 + 4.5)
+    btimes, low, high = viewer.envelope(times, values, 10, 15)
+    assert_array_equal(btimes, [10, 11, 12, 13, 14])
+    assert_array_equal(low, high)
+
+
+def test_qscan_images():
+    times, data = _data()
+    tiling = core.QTiling(DURATION, SAMPLE_RATE, frange=(10, 300))
+    qgram, _ = core.find_peak(tiling, core.fft(data), 0, GPS)
+    # (300 - 10) / 7 rounds to a grid of only 6 linear frequencies
+    nfreq, ntime = 7, 100
+    fmin, fmax = qgram.plane.frange
+    frequencies = numpy.logspace(numpy.log10(fmin), numpy.log10(fmax),
+                                 num=nfreq, endpoint=False)
+    for span in (.3, 1, 4):
+        _, freqs, values = qgram.interpolate(
+            span / ntime, frequencies=frequencies,
+            outseg=(GPS - span / 2., GPS + span / 2.))
+        assert values.shape == (ntime, nfreq)
+        assert_allclose(freqs, frequencies)
+    for image in viewer.qscan_images(qgram, GPS, [.3, 1, 4],
+                                     shape=(nfreq, ntime)):
+        assert viewer.decode_array(image['data']).shape == (nfreq, ntime)
+
+
+def test_channel_data(tmpdir):
+    times, data = _data()
+    tiling = core.QTiling(DURATION, SAMPLE_RATE, frange=(10, 300))
+    qgram, peak = core.find_peak(tiling, core.fft(data), 0, GPS)
+    table = core.eventgram(qgram)
+    out = viewer.channel_data(
+        'X1:TEST-CHANNEL', GPS, [1, 4], {'whitened': qgram},
+        {'whitened': table}, {'raw': (times, data)}, qgram.plane.q,
+        shape=(64, 128), nbins=100)
+    images = out['qscan']['whitened']['images']
+    assert [im['span'] for im in images] == [1, 4]
+    assert viewer.decode_array(images[0]['data']).shape == (64, 128)
+    assert abs(images[0]['vmax'] - peak['energy']) / peak['energy'] < .25
+    assert viewer.decode_array(out['colormap']).shape == (256, 3)
+    energy = viewer.decode_array(out['eventgram']['whitened']['energy'])
+    assert energy.max() == numpy.float32(peak['energy'])
+    series = out['timeseries']['raw']
+    assert viewer.decode_array(series[0]['low']).size == 100
+    # write and read back
+    filename = viewer.write_data(out, str(tmpdir.join('test.json')))
+    with open(filename) as fobj:
+        assert json.load(fobj) == out
+    assert viewer.data_filename('X1:TEST-CHANNEL') == (
+        'plots/X1-TEST_CHANNEL-omega.json')
@@ -58,6 +58,7 @@ install_requires = [
     'scipy>=0.16',
     'matplotlib>=2.0.0',
     'astropy>=1.2',
+    'h5py',
     'gwpy>=0.5',
     'lscsoft-glue',
     'gwtrigfind',
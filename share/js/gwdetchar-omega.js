@@ -25,15 +25,375 @@ $(document).ready(function() {
   });
 });
 
-function showImage(channelName, tRanges, imageType, captions) {
+function showImage(channelName, tRanges, imageType, captions, format) {
+  format = format || "png";
   for (var tIndex in tRanges) {
     var idBase = channelName + "_" + tRanges[tIndex];
     var fileBase = channelName + "-" + imageType + "-" + tRanges[tIndex];
+    // link the full-size image, but only load its thumbnail
     document.getElementById("a_" + idBase).href =
-      "plots/" + fileBase + ".png";
+      "plots/" + fileBase + "." + format;
     document.getElementById("a_" + idBase).title = captions[tIndex];
     document.getElementById("img_" + idBase).src =
-      "plots/" + fileBase + ".png";
-    document.getElementById("img_" + idBase).alt = fileBase + ".png";
+      "plots/thumbnails/" + fileBase + ".png";
+    document.getElementById("img_" + idBase).alt = fileBase + "." + format;
   };
 };
+
+// -- incremental pages --------------------------------------------------------
+
+// load the fragments of an incremental page as they are written, polling
+// its status marker until the analysis is complete
+function loadQscanFragments(statusUrl, interval) {
+  interval = interval || 10000;
+  var poll = function() {
+    setTimeout(function() { loadQscanFragments(statusUrl, interval); },
+               interval);
+  };
+  $.ajax({url: statusUrl, dataType: 'json', cache: false}).done(
+    function(status) {
+      $.each(status.fragments, function(key, revision) {
+        var fragment = $('#fragment-' + key);
+        if (fragment.data('revision') !== revision) {
+          fragment.data('revision', revision);
+          fragment.load(fragment.attr('data-src') + '?' + revision);
+        }
+      });
+      $.each(status.empty, function(i, key) {
+        $('#fragment-' + key).remove();
+        $('a[href="#block-' + key + '"]').parent().remove();
+      });
+      if (status.complete) {
+        $('#qscan-status').remove();
+      } else {
+        poll();
+      }
+    }).fail(poll);
+};
+
+// -- interactive viewer -------------------------------------------------------
+
+// data for each channel, keyed by the channel string used in element IDs
+var omegaData = {};
+
+// line colours for time series, by interferometer
+var omegaIfoColors = {
+  'H1': '#ee0000', 'L1': '#4ba6ff', 'V1': '#9b59b6', 'K1': '#ffb200',
+  'G1': '#222222', 'I1': '#b0dd8b'
+};
+
+// decode an array written by gwdetchar.omega.viewer.encode_array
+function decodeOmegaArray(encoded) {
+  var binary = atob(encoded.data);
+  var bytes = new Uint8Array(binary.length);
+  for (var i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  var stream = new Blob([bytes]).stream().pipeThrough(
+    new DecompressionStream('deflate'));
+  return new Response(stream).arrayBuffer().then(function(buffer) {
+    var array = (encoded.dtype == 'uint8') ? new Uint8Array(buffer) :
+                                             new Float32Array(buffer);
+    array.shape = encoded.shape;
+    return array;
+  });
+};
+
+// replace every encoded array in an object with its decoded values
+function decodeOmegaData(obj) {
+  var pending = [];
+  $.each(obj, function(key, value) {
+    if (value !== null && typeof value == 'object') {
+      if (value.dtype !== undefined && value.data !== undefined) {
+        pending.push(decodeOmegaArray(value).then(function(array) {
+          obj[key] = array;
+        }));
+      } else {
+        pending.push(decodeOmegaData(value));
+      }
+    }
+  });
+  return Promise.all(pending);
+};
+
+// load the data for one channel, then draw its default view
+function loadOmegaData(channelName, url, view) {
+  $.getJSON(url, function(data) {
+    decodeOmegaData(data).then(function() {
+      omegaData[channelName] = data;
+      showOmegaView(channelName, view || 'qscan_whitened');
+    });
+  });
+};
+
+// choose about `n` round tick positions between `low` and `high`
+function omegaTicks(low, high, n) {
+  var step = Math.pow(10, Math.floor(Math.log10((high - low) / n)));
+  var err = (high - low) / n / step;
+  if (err >= 5) {
+    step *= 5;
+  } else if (err >= 2) {
+    step *= 2;
+  }
+  var ticks = [];
+  for (var t = Math.ceil(low / step) * step; t <= high; t += step) {
+    ticks.push(Math.abs(t) < step / 1e6 ? 0 : t);
+  }
+  return ticks;
+};
+
+// choose tick positions at 1, 2, and 5 times powers of ten
+function omegaLogTicks(low, high) {
+  var ticks = [];
+  for (var p = Math.floor(Math.log10(low)); p <= Math.log10(high); p++) {
+    [1, 2, 5].forEach(function(m) {
+      var t = m * Math.pow(10, p);
+      if (t >= low && t <= high) {
+        ticks.push(t);
+      }
+    });
+  }
+  return ticks;
+};
+
+// draw the axes, ticks, labels, and title around a plot area
+function drawOmegaAxes(ctx, box, xlim, ylim, logy, xlabel, ylabel, title) {
+  var xscale = box.w / (xlim[1] - xlim[0]);
+  ctx.strokeStyle = '#000';
+  ctx.fillStyle = '#000';
+  ctx.lineWidth = 1;
+  ctx.strokeRect(box.x, box.y, box.w, box.h);
+  ctx.font = '11px sans-serif';
+  // time axis
+  ctx.textAlign = 'center';
+  ctx.textBaseline = 'top';
+  omegaTicks(xlim[0], xlim[1], 5).forEach(function(t) {
+    var x = box.x + (t - xlim[0]) * xscale;
+    ctx.beginPath();
+    ctx.moveTo(x, box.y + box.h);
+    ctx.lineTo(x, box.y + box.h + 4);
+    ctx.stroke();
+    ctx.fillText(+t.toPrecision(6), x, box.y + box.h + 6);
+  });
+  ctx.font = '13px sans-serif';
+  ctx.fillText(xlabel, box.x + box.w / 2, box.y + box.h + 22);
+  ctx.fillText(title, box.x + box.w / 2, 6);
+  // vertical axis
+  ctx.font = '11px sans-serif';
+  ctx.textAlign = 'right';
+  ctx.textBaseline = 'middle';
+  var ticks = logy ? omegaLogTicks(ylim[0], ylim[1]) :
+                     omegaTicks(ylim[0], ylim[1], 5);
+  ticks.forEach(function(t) {
+    var y = box.y + box.h * (1 - omegaScale(t, ylim, logy));
+    ctx.beginPath();
+    ctx.moveTo(box.x - 4, y);
+    ctx.lineTo(box.x, y);
+    ctx.stroke();
+    ctx.fillText(+t.toPrecision(4), box.x - 6, y);
+  });
+  ctx.save();
+  ctx.translate(12, box.y + box.h / 2);
+  ctx.rotate(-Math.PI / 2);
+  ctx.textAlign = 'center';
+  ctx.font = '13px sans-serif';
+  ctx.fillText(ylabel, 0, 0);
+  ctx.restore();
+};
+
+// fractional position of a value between two limits
+function omegaScale(value, lim, log) {
+  if (log) {
+    return Math.log(value / lim[0]) / Math.log(lim[1] / lim[0]);
+  }
+  return (value - lim[0]) / (lim[1] - lim[0]);
+};
+
+// return the CSS colour of a value from a colormap table
+function omegaColor(cmap, value, clim) {
+  var i = Math.round(255 * Math.min(Math.max(
+    (value - clim[0]) / (clim[1] - clim[0]), 0), 1));
+  return 'rgb(' + cmap[3 * i] + ',' + cmap[3 * i + 1] + ',' +
+         cmap[3 * i + 2] + ')';
+};
+
+// draw a vertical colour bar to the right of the plot area
+function drawOmegaColorbar(ctx, box, cmap, clim) {
+  var x = box.x + box.w + 10;
+  for (var i = 0; i < box.h; i++) {
+    var value = clim[0] + (clim[1] - clim[0]) * (1 - i / box.h);
+    ctx.fillStyle = omegaColor(cmap, value, clim);
+    ctx.fillRect(x, box.y + i, 12, 1);
+  }
+  ctx.strokeStyle = '#000';
+  ctx.strokeRect(x, box.y, 12, box.h);
+  ctx.fillStyle = '#000';
+  ctx.font = '11px sans-serif';
+  ctx.textAlign = 'left';
+  ctx.textBaseline = 'middle';
+  omegaTicks(clim[0], clim[1], 5).forEach(function(t) {
+    var y = box.y + box.h * (1 - omegaScale(t, clim, false));
+    ctx.fillText(+t.toPrecision(4), x + 16, y);
+  });
+};
+
+// draw a quantised Q-transform image
+function drawOmegaQscan(ctx, box, data, rep, index, autoscale) {
+  var qscan = data.qscan[rep];
+  var image = qscan.images[index];
+  var clim = autoscale ? [0, image.vmax] : [0, 25];
+  // colour of each quantisation level
+  var scale = Math.log1p(image.vmax) / 255;
+  var lut = [];
+  for (var q = 0; q < 256; q++) {
+    var i = Math.round(255 * Math.min(Math.max(
+      (Math.expm1(q * scale) - clim[0]) / (clim[1] - clim[0]), 0), 1));
+    lut.push(i);
+  }
+  var rows = image.data.shape[0], cols = image.data.shape[1];
+  var buffer = document.createElement('canvas');
+  buffer.width = cols;
+  buffer.height = rows;
+  var bctx = buffer.getContext('2d');
+  var pixels = bctx.createImageData(cols, rows);
+  for (var r = 0; r < rows; r++) {
+    for (var c = 0; c < cols; c++) {
+      // image rows increase in frequency, canvas rows go downwards
+      var k = lut[image.data[r * cols + c]];
+      var p = 4 * ((rows - 1 - r) * cols + c);
+      pixels.data[p] = data.colormap[3 * k];
+      pixels.data[p + 1] = data.colormap[3 * k + 1];
+      pixels.data[p + 2] = data.colormap[3 * k + 2];
+      pixels.data[p + 3] = 255;
+    }
+  }
+  bctx.putImageData(pixels, 0, 0);
+  ctx.imageSmoothingEnabled = false;
+  ctx.drawImage(buffer, box.x, box.y, box.w, box.h);
+  drawOmegaColorbar(ctx, box, data.colormap, clim);
+  return qscan.frange;
+};
+
+// draw eventgram tiles as rectangles
+function drawOmegaEventgram(ctx, box, data, rep, span, autoscale) {
+  var tiles = data.eventgram[rep];
+  var xlim = [-span / 2, span / 2];
+  var ylim = [Infinity, -Infinity];
+  var clim = [0, 25];
+  var n = tiles.energy.length;
+  if (autoscale) {
+    clim = [Infinity, -Infinity];
+  }
+  for (var i = 0; i < n; i++) {
+    ylim[0] = Math.min(ylim[0], tiles.frequency[i] - tiles.bandwidth[i] / 2);
+    ylim[1] = Math.max(ylim[1], tiles.frequency[i] + tiles.bandwidth[i] / 2);
+    if (autoscale) {
+      clim[0] = Math.min(clim[0], tiles.energy[i]);
+      clim[1] = Math.max(clim[1], tiles.energy[i]);
+    }
+  }
+  if (!n) {
+    ylim = [1, 10];
+    clim = [0, 1];
+  }
+  ctx.fillStyle = omegaColor(data.colormap, clim[0], clim);
+  ctx.fillRect(box.x, box.y, box.w, box.h);
+  ctx.save();
+  ctx.beginPath();
+  ctx.rect(box.x, box.y, box.w, box.h);
+  ctx.clip();
+  // draw the loudest tiles last
+  var order = [];
+  for (var i = 0; i < n; i++) {
+    order.push(i);
+  }
+  order.sort(function(a, b) { return tiles.energy[a] - tiles.energy[b]; });
+  order.forEach(function(i) {
+    var x0 = omegaScale(tiles.time[i] - tiles.duration[i] / 2, xlim, false);
+    var x1 = omegaScale(tiles.time[i] + tiles.duration[i] / 2, xlim, false);
+    if (x1 < 0 || x0 > 1) {
+      return;
+    }
+    var y0 = omegaScale(
+      tiles.frequency[i] - tiles.bandwidth[i] / 2, ylim, true);
+    var y1 = omegaScale(
+      tiles.frequency[i] + tiles.bandwidth[i] / 2, ylim, true);
+    ctx.fillStyle = omegaColor(data.colormap, tiles.energy[i], clim);
+    ctx.fillRect(box.x + x0 * box.w, box.y + (1 - y1) * box.h,
+                 Math.max((x1 - x0) * box.w, 1),
+                 Math.max((y1 - y0) * box.h, 1));
+  });
+  ctx.restore();
+  drawOmegaColorbar(ctx, box, data.colormap, clim);
+  return ylim;
+};
+
+// draw the envelope of a decimated time series
+function drawOmegaTimeseries(ctx, box, data, rep, index, span) {
+  var series = data.timeseries[rep][index];
+  var xlim = [-span / 2, span / 2];
+  var ylim = [Infinity, -Infinity];
+  var n = series.time.length;
+  for (var i = 0; i < n; i++) {
+    ylim[0] = Math.min(ylim[0], series.low[i]);
+    ylim[1] = Math.max(ylim[1], series.high[i]);
+  }
+  var margin = (ylim[1] - ylim[0]) * .05 || 1;
+  ylim = [ylim[0] - margin, ylim[1] + margin];
+  ctx.strokeStyle = omegaIfoColors[data.channel.substring(0, 2)] || '#000';
+  ctx.fillStyle = ctx.strokeStyle;
+  ctx.lineWidth = 1;
+  ctx.beginPath();
+  for (var i = 0; i < n; i++) {
+    var x = box.x + box.w * omegaScale(series.time[i], xlim, false);
+    ctx.lineTo(x, box.y + box.h * (1 - omegaScale(series.high[i], ylim)));
+  }
+  for (var i = n - 1; i >= 0; i--) {
+    var x = box.x + box.w * omegaScale(series.time[i], xlim, false);
+    ctx.lineTo(x, box.y + box.h * (1 - omegaScale(series.low[i], ylim)));
+  }
+  ctx.closePath();
+  ctx.fill();
+  ctx.stroke();
+  return ylim;
+};
+
+// draw one view of a channel for every time span
+function showOmegaView(channelName, plotType) {
+  var data = omegaData[channelName];
+  if (data === undefined) {
+    return;
+  }
+  var parts = plotType.split('_');
+  var kind = parts[0], variant = parts[1];
+  var rep = (variant == 'autoscaled') ? 'whitened' : variant;
+  var autoscale = (variant == 'autoscaled');
+  var title = data.channel + ' at ' + data.gps.toFixed(3);
+  if (kind != 'timeseries') {
+    title += ' with Q=' + data.q.toFixed(1);
+  }
+  data.pranges.forEach(function(span, index) {
+    var canvas = document.getElementById(
+      'canvas_' + channelName + '_' + span);
+    var ctx = canvas.getContext('2d');
+    var box = {x: 60, y: 26, w: canvas.width - 130, h: canvas.height - 72};
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    var ylim, logy = true, ylabel = 'Frequency [Hz]';
+    if (kind == 'qscan') {
+      ylim = drawOmegaQscan(ctx, box, data, rep, index, autoscale);
+    } else if (kind == 'eventgram') {
+      ylim = drawOmegaEventgram(ctx, box, data, rep, span, autoscale);
+    } else {
+      ylim = drawOmegaTimeseries(ctx, box, data, rep, index, span);
+      logy = false;
+      ylabel = {'raw': 'Amplitude', 'highpassed': 'Highpassed Amplitude',
+                'whitened': 'Whitened Amplitude'}[rep];
+    }
+    var xlim = [-span / 2, span / 2], xlabel = 'Time [seconds]';
+    if (span <= 1) {
+      xlim = [-span * 500, span * 500];
+      xlabel = 'Time [milliseconds]';
+    }
+    drawOmegaAxes(ctx, box, xlim, ylim, logy, xlabel, ylabel, title);
+  });
+};